@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+
+# Асинхронный фасад над Database для обработчиков. Блокирующие запросы
+# выполняются в отдельном пуле из DB_WORKERS потоков: пока идет запрос,
+# event loop шарда обслуживает другие чаты, а одновременно к базе
+# обращается не больше DB_WORKERS запросов, остальные ждут в очереди пула.
+# Возвращаются только неизменяемые записи из records.py
+class AsyncDatabase:
+    def __init__(self, db, workers=None):
+        self.db = db
+        self.workers = workers or Config.DB_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='db')
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.calls = 0
+
+    async def get_or_create_user(self, telegram_id, username=None, first_name=None, last_name=None):
+        # Запись из кэша отдаем сразу, без перехода в пул
+        record = self.db.user_cache.get(telegram_id)
+        if record:
+            return record
+        return await self._run(self.db.get_or_create_user, telegram_id, username, first_name, last_name)
+
+    async def get_daily_words(self, user_id, count=None):
+        return tuple(await self._run(self.db.get_daily_words, user_id, count))
+
+    async def update_word_progress(self, user_id, word_id, correct):
+        # Ответ только ставится в журнал, в базу его пишет фоновый поток
+        self.db.update_word_progress(user_id, word_id, correct)
+
+    async def get_user_stats(self, user_id):
+        return await self._run(self.db.get_user_stats, user_id)
+
+    def stop(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self.pending, 'calls': self.calls}
+
+    async def _run(self, method, *args):
+        with self._lock:
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # С контекстом вызывающей задачи: запросы в пуле считаются на ее обработчик
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, context.run, method, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.calls += 1
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Имена файлов прежнего кэша: md5 от параметров озвучки
+LEGACY_FILE = re.compile(r'^[0-9a-f]{32}\.(ogg|mp3)$')
+
+
+# Дисковый кэш озвучки с адресацией по содержимому.
+# Индекс в памяти (LRU) + журнал manifest.jsonl на диске, вытеснение
+# по бюджету в байтах, файлы появляются только через атомарный rename.
+# Журнал пишут несколько процессов (бот и prerender_audio.py): каждая
+# запись и перезапись журнала идет под файловой блокировкой manifest.lock
+class AudioCache:
+    MANIFEST = 'manifest.jsonl'
+    LOCK_FILE = 'manifest.lock'
+    TMP_PREFIX = '.tmp-'
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, self.MANIFEST)
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._log_lines = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(cache_dir, self.LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        self._load()
+
+    @staticmethod
+    def make_key(text, lang, slow, codec, bitrate):
+        key_string = '\0'.join([text, lang, '1' if slow else '0', codec, bitrate])
+        return hashlib.sha1(key_string.encode()).hexdigest()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, ext, count=True):
+        # Попадание - только поиск в индексе, без обращения к диску. Файл,
+        # удаленный в обход кэша, вызывающий возвращает через discard()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += count
+                return os.path.join(self.cache_dir, entry[0])
+
+        # Файл мог положить другой процесс (например, prerender_audio.py)
+        path = self._path(key, ext)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            with self._lock:
+                self.misses += count
+            return None
+        self._add(key, key + ext, size)
+        with self._lock:
+            self.hits += count
+        return path
+
+    @staticmethod
+    def key_of(path):
+        # Ключ клипа по пути файла в кэше (имя файла - ключ + расширение)
+        return os.path.basename(path).split('.', 1)[0]
+
+    def discard(self, path):
+        # Файла по пути из get() уже нет на диске
+        self._drop(self.key_of(path))
+
+    def temp_path(self, suffix):
+        fd, path = tempfile.mkstemp(prefix=self.TMP_PREFIX, suffix=suffix, dir=self.cache_dir)
+        os.close(fd)
+        return path
+
+    def put_file(self, key, ext, src_path):
+        # src_path должен лежать в cache_dir (см. temp_path), тогда
+        # os.replace атомарен и читатели не увидят недописанный файл
+        path = self._path(key, ext)
+        size = os.path.getsize(src_path)
+        os.replace(src_path, path)
+        self._add(key, key + ext, size)
+        return path
+
+    def stats(self):
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        total = hits + misses
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+            'hit_ratio': hits / total if total else 0
+        }
+
+    def compact(self):
+        with self._lock, self._manifest_lock():
+            # Журнал мог дописать другой процесс: его записи добавляем как самые
+            # старые, а ключи, которые он вытеснил, убираем
+            on_disk = self._read_manifest()
+            merged = OrderedDict((key, entry) for key, entry in on_disk.items() if key not in self._entries)
+            merged.update((key, entry) for key, entry in self._entries.items() if key in on_disk)
+            self._entries = merged
+            self._bytes = sum(size for _, size in merged.values())
+
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                for key, (filename, size) in merged.items():
+                    f.write(json.dumps({'op': 'put', 'key': key, 'file': filename, 'size': size}) + '\n')
+            os.replace(tmp_path, self.manifest_path)
+            self._log_lines = len(merged)
+
+    def _path(self, key, ext):
+        return os.path.join(self.cache_dir, key + ext)
+
+    def _add(self, key, filename, size):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (filename, size)
+            self._bytes += size
+            self._append({'op': 'put', 'key': key, 'file': filename, 'size': size})
+
+        self._enforce_budget()
+        if self._log_lines > 2 * len(self._entries) + 100:
+            self.compact()
+
+    def _enforce_budget(self):
+        evicted = []
+        with self._lock:
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                key, (filename, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                evicted.append(filename)
+                self._append({'op': 'del', 'key': key})
+
+        for filename in evicted:
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except OSError:
+                pass
+
+    def _drop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+                self._append({'op': 'del', 'key': key})
+
+    def _manifest_lock(self):
+        # Межпроцессная блокировка; внутри процесса записи уже идут под self._lock
+        return _FileLock(self._lock_fd)
+
+    def _append(self, record):
+        with self._manifest_lock():
+            with open(self.manifest_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        self._log_lines += 1
+
+    def _read_manifest(self):
+        entries = OrderedDict()
+        if not os.path.exists(self.manifest_path):
+            return entries
+        with open(self.manifest_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после падения
+                    continue
+                entries.pop(record['key'], None)
+                if record['op'] == 'put':
+                    entries[record['key']] = (record['file'], record['size'])
+        return entries
+
+    def _load(self):
+        # Недописанные файлы от упавших процессов (свежие может писать соседний процесс)
+        stale = time.time() - 3600
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if filename.startswith(self.TMP_PREFIX) and os.path.getmtime(path) < stale:
+                os.remove(path)
+
+        if not os.path.exists(self.manifest_path):
+            # Клипы старого кэша (md5-ключи) по новым ключам не найти. Удаляем
+            # только их: каталог может быть общим, чужие файлы не трогаем
+            for filename in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, filename)
+                if LEGACY_FILE.match(filename) and os.path.isfile(path):
+                    os.remove(path)
+            return
+
+        with self._manifest_lock():
+            self._entries = self._read_manifest()
+        self._bytes = sum(size for _, size in self._entries.values())
+        self._enforce_budget()
+        self.compact()
+        logger.info(f"Voice cache: {len(self._entries)} files, {self._bytes / 1024 / 1024:.1f} MB")
+
+
+class _FileLock:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __enter__(self):
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
@@ -0,0 +1,94 @@
+# Нагрузочный тест AsyncDatabase: обработчики на шардах ChatExecutor, часть
+# обновлений попадает на медленный запрос. Сравнивает вызов базы прямо из
+# корутины (поток шарда стоит на запросе) с вызовом через пул AsyncDatabase
+#
+#   python benchmarks/bench_async_db.py --workers 2 --updates 200 --slow 20 --slow-query 0.05
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+# Заглушка Database: запрос занимает заданное время и держит вызывающий поток
+class SlowDatabase:
+    def __init__(self, slow_users, slow_query, fast_query):
+        self.slow_users = slow_users
+        self.slow_query = slow_query
+        self.fast_query = fast_query
+        self.user_cache = {}
+
+    def get_user_stats(self, user_id):
+        time.sleep(self.slow_query if user_id in self.slow_users else self.fast_query)
+        return user_id
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(args, mode):
+    from async_database import AsyncDatabase
+    from dispatch import ChatExecutor
+
+    rng = random.Random(args.seed)
+    slow_users = set(rng.sample(range(1, args.updates + 1), args.slow))
+    db = SlowDatabase(slow_users, args.slow_query, args.fast_query)
+    async_db = AsyncDatabase(db, workers=args.db_workers)
+    executor = ChatExecutor(args.workers, max_pending=args.updates)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def handler(user_id, submitted):
+        async def handle():
+            if mode == 'sync':
+                db.get_user_stats(user_id)
+            else:
+                await async_db.get_user_stats(user_id)
+            with lock:
+                latencies.append(time.perf_counter() - submitted)
+        return handle()
+
+    started = time.perf_counter()
+    futures = []
+    # Каждое обновление из своего чата: порядок внутри чата не сдерживает шарды
+    for user_id in range(1, args.updates + 1):
+        futures.append(executor.submit(user_id, handler(user_id, time.perf_counter())))
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - started
+
+    executor.stop()
+    async_db.stop()
+    print(f"{mode:>5}: batch {elapsed:6.2f} s, latency p50 {percentile(latencies, 0.5) * 1000:7.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms, max {max(latencies) * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2, help="ChatExecutor shards")
+    parser.add_argument('--db-workers', type=int, default=None, help="Defaults to DB_WORKERS")
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--slow', type=int, default=20, help="Updates that hit the slow query")
+    parser.add_argument('--slow-query', type=float, default=0.05, help="Seconds per slow query")
+    parser.add_argument('--fast-query', type=float, default=0.0005, help="Seconds per regular query")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from config import Config
+    args.db_workers = args.db_workers or Config.DB_WORKERS
+
+    print(f"{args.workers} shards, {args.db_workers} db workers, {args.updates} updates, "
+          f"{args.slow} of them hit a {args.slow_query * 1000:.0f} ms query")
+    for mode in ('sync', 'async'):
+        run(args, mode)
+
+
+if __name__ == '__main__':
+    main()
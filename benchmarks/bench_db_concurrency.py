@@ -0,0 +1,127 @@
+# Конкурентная нагрузка на Database: потоки-обработчики читают статистику
+# (get_user_stats) и пишут ответы (apply_reviews) одновременно. Сравниваются
+# старые настройки SQLite (rollback-журнал, synchronous=FULL, один пул),
+# WAL без остального и полный набор PRAGMA с read-only пулом для статистики
+#
+#   python benchmarks/bench_db_concurrency.py --threads 8 --seconds 5 --users 500 --write-share 0.3
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from database import Database
+from review_journal import ReviewEvent
+
+LEVELS = list(Config.LEVELS)
+
+CONFIGURATIONS = {
+    'legacy': {
+        'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': 0,
+        'SQLITE_CACHE_SIZE': -2000, 'SQLITE_READ_POOL_SIZE': 0
+    },
+    'wal': {
+        'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL', 'SQLITE_MMAP_SIZE': 0,
+        'SQLITE_CACHE_SIZE': -2000, 'SQLITE_READ_POOL_SIZE': 0
+    },
+    'tuned': {
+        'SQLITE_JOURNAL_MODE': Config.SQLITE_JOURNAL_MODE, 'SQLITE_SYNCHRONOUS': Config.SQLITE_SYNCHRONOUS,
+        'SQLITE_MMAP_SIZE': Config.SQLITE_MMAP_SIZE, 'SQLITE_CACHE_SIZE': Config.SQLITE_CACHE_SIZE,
+        'SQLITE_READ_POOL_SIZE': Config.SQLITE_READ_POOL_SIZE
+    }
+}
+
+
+def seed(db, users, words):
+    rows = [{
+        'word': f'word{i}', 'translation': f'слово{i}', 'transcription': None, 'example': None,
+        'example_translation': None, 'level': LEVELS[i % len(LEVELS)], 'part_of_speech': None,
+        'topic': None, 'frequency': (i * 7919) % 100000
+    } for i in range(words)]
+    db.upsert_words(rows)
+    db.dictionary_changed()
+    return [db.get_or_create_user(telegram_id).id for telegram_id in range(1, users + 1)]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def run(db, user_ids, words, threads, seconds, write_share, batch):
+    reads, writes, errors = [], [], []
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        while time.perf_counter() < deadline:
+            user_id = rnd.choice(user_ids)
+            started = time.perf_counter()
+            try:
+                if rnd.random() < write_share:
+                    now = datetime.utcnow()
+                    db.apply_reviews([
+                        ReviewEvent(user_id, rnd.randint(1, words), rnd.random() < 0.8, now)
+                        for _ in range(batch)
+                    ])
+                    writes.append(time.perf_counter() - started)
+                else:
+                    db.get_user_stats(user_id)
+                    reads.append(time.perf_counter() - started)
+            except OperationalError as e:
+                errors.append(str(e.orig))
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return reads, writes, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--words', type=int, default=5000)
+    parser.add_argument('--write-share', type=float, default=0.3)
+    parser.add_argument('--batch', type=int, default=10, help="Reviews per write transaction")
+    args = parser.parse_args()
+
+    Config.DICTIONARY_PATH = os.devnull
+    print(f"{args.threads} threads, {args.seconds:.0f}s, {args.users} users, "
+          f"{args.write_share:.0%} writes of {args.batch} reviews")
+    for name in args.configs:
+        for option, value in CONFIGURATIONS[name].items():
+            setattr(Config, option, value)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bench.db'))
+            user_ids = seed(db, args.users, args.words)
+            reads, writes, errors = run(db, user_ids, args.words, args.threads,
+                                        args.seconds, args.write_share, args.batch)
+            db.close()
+
+        total = len(reads) + len(writes)
+        print(f"{name:>6}: {total / args.seconds:7.0f} ops/s | "
+              f"stats p50 {percentile(reads, 0.5):6.2f} ms p99 {percentile(reads, 0.99):7.2f} ms | "
+              f"reviews p50 {percentile(writes, 0.5):6.2f} ms p99 {percentile(writes, 0.99):7.2f} ms | "
+              f"errors {len(errors)}")
+        for error in sorted(set(errors)):
+            print(f"        {errors.count(error)} x {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Нагрузочный тест ChatExecutor: обработчики урока на фейковом Bot API
+# с задержкой сети, пропускная способность в зависимости от числа потоков
+# и проверка, что обновления одного чата идут строго по порядку
+#
+#   python benchmarks/bench_dispatch.py --workers 1 2 4 8 16 --users 200 --updates 1000 --latency 0.02
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds per Bot API call")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+    os.chdir(tmp)
+
+    import handlers
+    from config import Config
+    from dispatch import ChatExecutor
+    from fakes import FakeBot, FakeContext, FakeJobQueue, FakeUpdate
+
+    bot = FakeBot(latency=args.latency)
+    job_queue = FakeJobQueue(bot)
+    contexts = {}
+    for user_id in range(1, args.users + 1):
+        handlers.db.get_or_create_user(user_id)
+        handlers.db.update_user(user_id, audio_enabled=False)
+        contexts[user_id] = FakeContext(bot, job_queue)
+
+    order_errors = []
+    overlap_errors = []
+    running = set()
+    running_lock = threading.Lock()
+
+    def tap(user_id, seq, seen):
+        async def run():
+            with running_lock:
+                if user_id in running:
+                    overlap_errors.append(user_id)
+                running.add(user_id)
+            try:
+                if seen and seen[-1] > seq:
+                    order_errors.append(user_id)
+                seen.append(seq)
+
+                context = contexts[user_id]
+                session = handlers.lessons.get(user_id)
+                if not session or session.current_word_id is None:
+                    await handlers.learn_today(FakeUpdate(bot, user_id, 'learn_today'), context)
+                else:
+                    data = f'know_{session.current_word_id}'
+                    await handlers.word_callback(FakeUpdate(bot, user_id, data), context)
+            finally:
+                with running_lock:
+                    running.discard(user_id)
+        return run()
+
+    print(f"{args.users} users, {args.updates} updates, {args.latency * 1000:.0f} ms per Bot API call")
+    for workers in args.workers:
+        executor = ChatExecutor(workers, max_pending=200)
+        handlers.chat_executor = executor
+        seen = {user_id: [] for user_id in contexts}
+
+        started = time.perf_counter()
+        futures = []
+        max_depth = 0
+        for i in range(args.updates):
+            user_id = i % args.users + 1
+            futures.append(executor.submit(user_id, tap(user_id, i, seen[user_id])))
+            max_depth = max(max_depth, executor.stats()['queue_depth'])
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - started
+
+        stats = executor.stats()
+        # Отложенные шаги урока (таймеры JobQueue) тоже идут через шарды:
+        # дожидаемся их, прежде чем останавливать исполнитель
+        time.sleep(max(Config.FEEDBACK_DELAY, Config.EXAMPLE_DELAY) + 0.5)
+        while executor.stats()['queue_depth']:
+            time.sleep(0.1)
+        executor.stop()
+        print(f"{workers:>3} workers: {args.updates / elapsed:8.1f} updates/s, "
+              f"latency avg {stats['latency_avg'] * 1000:6.1f} ms, "
+              f"wait avg {stats['wait_avg'] * 1000:7.1f} ms, max depth {max_depth}, "
+              f"failed {stats['failed']}")
+
+    print(f"ordering violations: {len(order_errors)}, concurrent runs of one chat: {len(overlap_errors)}")
+    handlers.db.close()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
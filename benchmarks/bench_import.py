@@ -0,0 +1,76 @@
+# Импорт словаря: старый путь (session.add на каждое слово) против
+# потокового upsert из dictionary.py, плюс повторный импорт без изменений
+#
+#   python benchmarks/bench_import.py --words 200000
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+from dictionary import WORD_FIELDS, import_dictionary, read_rows, normalize_row
+from models import Word
+
+LEVELS = list(Config.LEVELS)
+
+
+def write_csv(path, words):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(WORD_FIELDS)
+        for i in range(words):
+            writer.writerow([
+                f'word{i}', f'слово{i}', f'wɜːd{i}', f'An example with word{i}.', f'Пример со словом{i}.',
+                LEVELS[i % len(LEVELS)], 'noun', f'topic{i % 50}', i % 1000
+            ])
+
+
+def empty_db(tmp, name):
+    # Пустой словарь вместо seed_words.csv
+    Config.DICTIONARY_PATH = os.devnull
+    return Database(os.path.join(tmp, name))
+
+
+def bench_orm(db, path):
+    started = time.perf_counter()
+    session = db.get_session()
+    for row in read_rows(path):
+        session.add(Word(**normalize_row(row)))
+    session.commit()
+    session.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--words', type=int, default=200000)
+    parser.add_argument('--orm-words', type=int, default=20000, help="The ORM path is slow, time it on fewer rows")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'words.csv')
+        write_csv(path, args.words)
+        small = os.path.join(tmp, 'small.csv')
+        write_csv(small, args.orm_words)
+
+        db = empty_db(tmp, 'orm.db')
+        elapsed = bench_orm(db, small)
+        db.close()
+        print(f"session.add:      {args.orm_words:>7} rows in {elapsed:6.2f}s ({args.orm_words / elapsed:>9,.0f} rows/s)")
+
+        db = empty_db(tmp, 'import.db')
+        for label in ('import_dictionary', 're-import'):
+            report = import_dictionary(db, path)
+            print(f"{label + ':':<17} {report['rows']:>7} rows in {report['elapsed']:6.2f}s "
+                  f"({report['rows'] / report['elapsed']:>9,.0f} rows/s), "
+                  f"{report['inserted']} new, {report['updated']} updated")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
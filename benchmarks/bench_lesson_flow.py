@@ -0,0 +1,99 @@
+# Пропускная способность word_callback на фиксированном числе потоков-обработчиков.
+# --legacy воспроизводит прежнее поведение: отложенный шаг урока выполняется
+# в том же потоке после time.sleep, как было до job_queue
+#
+#   python benchmarks/bench_lesson_flow.py --workers 4 --users 200 --duration 10
+#   python benchmarks/bench_lesson_flow.py --workers 4 --users 200 --duration 10 --legacy
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--legacy', action='store_true', help="Sleep through lesson delays in the handler thread")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+    os.chdir(tmp)
+
+    import handlers
+    from fakes import FakeBot, FakeContext, FakeJob, FakeJobQueue, FakeUpdate
+
+    class InlineJobQueue(FakeJobQueue):
+        # Шаг не уходит в таймер, а ждет своей задержки в потоке обработчика
+        def __init__(self, bot):
+            super().__init__(bot)
+            self.local = threading.local()
+
+        def run_once(self, callback, when, context=None, name=None):
+            job = FakeJob(callback, context)
+            self.local.__dict__.setdefault('jobs', []).append((when, job))
+            self.scheduled += 1
+            return job
+
+        def run_pending(self):
+            jobs = self.local.__dict__.pop('jobs', [])
+            for when, job in jobs:
+                time.sleep(when)
+                self._run(job)
+
+    bot = FakeBot()
+    job_queue = InlineJobQueue(bot) if args.legacy else FakeJobQueue(bot)
+    contexts = {}
+    for user_id in range(1, args.users + 1):
+        handlers.db.get_or_create_user(user_id)
+        contexts[user_id] = FakeContext(bot, job_queue)
+
+    def tap(user_id):
+        context = contexts[user_id]
+        session = handlers.lessons.get(user_id)
+        if not session or session.current_word_id is None:
+            asyncio.run(handlers.learn_today(FakeUpdate(bot, user_id, 'learn_today'), context))
+            session = handlers.lessons.get(user_id)
+        data = f'know_{session.current_word_id}'
+        asyncio.run(handlers.word_callback(FakeUpdate(bot, user_id, data), context))
+        if args.legacy:
+            job_queue.run_pending()
+
+    done = [0] * args.workers
+    deadline = time.perf_counter() + args.duration
+
+    def worker(index):
+        users = list(range(index + 1, args.users + 1, args.workers))
+        i = 0
+        while time.perf_counter() < deadline:
+            tap(users[i % len(users)])
+            done[index] += 1
+            i += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(done)
+    mode = 'legacy sleep' if args.legacy else 'job queue'
+    print(f'{mode}, {args.workers} workers, {args.users} users: {total} callbacks in {elapsed:.1f}s '
+          f'= {total / elapsed:.1f} callbacks/s')
+    handlers.db.close()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Память под незавершенные уроки: старый dict с ORM-объектами Word
+# против LessonSessionStore
+#
+#   python benchmarks/bench_lesson_sessions.py --sessions 100000 --words 10
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lesson_sessions import LessonSessionStore
+from models import Word
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, keep
+
+
+def legacy_sessions(sessions, words):
+    user_sessions = {}
+    for user_id in range(sessions):
+        lesson_words = [
+            Word(id=user_id * words + i, word=f'word{i}', translation=f'слово{i}',
+                 transcription='wɜːd', example='An example sentence.',
+                 example_translation='Пример предложения.', level='A1',
+                 part_of_speech='noun', topic='basics', frequency=100)
+            for i in range(words)
+        ]
+        user_sessions[user_id] = {
+            'words': lesson_words,
+            'current_index': 0,
+            'correct': 0,
+            'total': len(lesson_words),
+            'start_time': datetime.utcnow()
+        }
+    return user_sessions
+
+
+def store_sessions(sessions, words):
+    store = LessonSessionStore(max_bytes=1 << 40)
+    for user_id in range(sessions):
+        store.start(user_id, range(user_id * words, user_id * words + words))
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=10)
+    parser.add_argument('--legacy-sample', type=int, default=10000)
+    args = parser.parse_args()
+
+    used, store = measure(lambda: store_sessions(args.sessions, args.words))
+    print(f'LessonSessionStore: {args.sessions} sessions x {args.words} words = '
+          f'{used / 1024 / 1024:.1f} MiB ({used / args.sessions:.0f} B/session, '
+          f'store accounting {store.stats()["bytes"] / 1024 / 1024:.1f} MiB)')
+    del store
+
+    # ORM-объекты тяжелые, меряем на выборке и масштабируем
+    sample = min(args.legacy_sample, args.sessions)
+    used, legacy = measure(lambda: legacy_sessions(sample, args.words))
+    per_session = used / sample
+    print(f'user_sessions dict: {per_session:.0f} B/session, '
+          f'~{per_session * args.sessions / 1024 / 1024:.1f} MiB for {args.sessions} sessions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+# Нагрузочный тест всего бота: локальная заглушка Bot API (fake_telegram.py),
+# Updater и обработчики из main.create_updater, временная SQLite со словарем
+# заданного размера. Пользователи проходят /start -> уровень -> learn_today ->
+# знаю / не знаю / аудио-тест -> статистика с паузами на раздумье и нажимают
+# только те кнопки, которые бот им действительно прислал.
+# Задержка считается от постановки обновления в очередь диспетчера до первого
+# сообщения бота в этот чат (answerCallbackQuery не в счет)
+#
+#   python benchmarks/bench_load.py --users 1000 --words 5000 --lessons 1 --think 2 --ramp 20
+import argparse
+import csv
+import heapq
+import itertools
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import BOT_USER, EDIT_METHODS, SEND_METHODS, FakeTelegramServer, keyboard
+
+TOKEN = '123456:LOADTEST'
+
+CONTENT_METHODS = SEND_METHODS + EDIT_METHODS
+
+# Метка в отчете по префиксу callback_data
+LABELS = [
+    ('level_', 'level_callback'),
+    ('learn_today', 'learn_today'),
+    ('know_', 'word_callback:know'),
+    ('dont_know_', 'word_callback:dont_know'),
+    ('quiz_', 'word_callback:quiz'),
+    ('qa_', 'test_answer'),
+    ('stats', 'stats')
+]
+
+
+def write_dictionary(path, words, levels):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['word', 'translation', 'transcription', 'example', 'example_translation',
+                         'level', 'part_of_speech', 'topic', 'frequency'])
+        for i in range(words):
+            writer.writerow([
+                f'word{i}', f'перевод{i}', f'wɜːd{i}', f'This is an example with word{i}.',
+                f'Пример со словом {i}.', levels[i % len(levels)],
+                ('noun', 'verb', 'adjective')[i % 3], f'topic{i % 20}', (i * 7919) % 100000
+            ])
+
+
+class SimUser:
+    __slots__ = ('user_id', 'message_id', 'keyboard', 'pending', 'sent_at', 'scheduled',
+                 'last_event', 'lessons', 'empty_menus', 'done')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.message_id = None
+        self.keyboard = None
+        self.pending = None
+        self.sent_at = 0.0
+        self.scheduled = False
+        self.last_event = 0.0
+        self.lessons = 0
+        self.empty_menus = 0
+        self.done = False
+
+
+class Simulation:
+    def __init__(self, bot, update_queue, args):
+        self.bot = bot
+        self.update_queue = update_queue
+        self.args = args
+        self.users = {}
+        self.samples = {}
+        self.lesson_times = []
+        self.sent = 0
+        self.timeouts = 0
+        self._update_ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._heap = []
+        self._cond = threading.Condition()
+        self.rnd = random.Random(args.seed)
+
+    def start(self):
+        now = time.perf_counter()
+        with self._cond:
+            for i in range(1, self.args.users + 1):
+                user = self.users[1000000 + i] = SimUser(1000000 + i)
+                user.last_event = now
+                self._schedule(user, now + self.rnd.uniform(0, self.args.ramp))
+
+    def on_call(self, method, params, result):
+        # Вызов Bot API из обработчика (потоки сервера-заглушки)
+        if method not in CONTENT_METHODS:
+            return
+        user = self.users.get(int(params.get('chat_id') or 0))
+        if user is None:
+            return
+
+        now = time.perf_counter()
+        with self._cond:
+            user.last_event = now
+            if user.pending:
+                self.samples.setdefault(user.pending, []).append(now - user.sent_at)
+                user.pending = None
+
+            buttons = keyboard(params)
+            if buttons is None or user.done:
+                return
+            user.keyboard = buttons
+            user.message_id = result['message_id'] if isinstance(result, dict) else user.message_id
+            if not user.scheduled:
+                self._schedule(user, now + self.rnd.expovariate(1 / self.args.think) if self.args.think else now)
+
+    def run(self):
+        deadline = time.perf_counter() + self.args.duration
+        while True:
+            with self._cond:
+                now = time.perf_counter()
+                if now >= deadline or all(user.done for user in self.users.values()):
+                    return
+                self._check_stalled(now)
+                if not self._heap or self._heap[0][0] > now:
+                    self._cond.wait(min(0.5, self._heap[0][0] - now) if self._heap else 0.5)
+                    continue
+                due, seq, user = heapq.heappop(self._heap)
+                user.scheduled = False
+                update = self._next_update(user, now)
+            if update is not None:
+                # Очередь диспетчера ограничена: при перегрузке ждем здесь
+                self.update_queue.put(update)
+
+    def _schedule(self, user, due):
+        user.scheduled = True
+        heapq.heappush(self._heap, (due, next(self._seq), user))
+        self._cond.notify()
+
+    def _check_stalled(self, now):
+        # Пользователь без ответа дольше timeout секунд выбывает из теста
+        for user in self.users.values():
+            if not user.done and not user.scheduled and now - user.last_event > self.args.timeout:
+                user.done = True
+                self.timeouts += 1
+
+    def _next_update(self, user, now):
+        if user.done:
+            return None
+        if user.keyboard is None:
+            return self._message_update(user, '/start', now)
+
+        buttons = user.keyboard
+        levels = [b for b in buttons if b.startswith('level_')]
+        answers = [b for b in buttons if b.startswith('qa_')]
+        word = next((b for b in buttons if b.startswith('know_')), None)
+
+        if levels:
+            data = self.rnd.choice(levels)
+        elif answers:
+            data = self.rnd.choice(answers)
+        elif word:
+            word_id = word.split('_')[-1]
+            roll = self.rnd.random()
+            if roll < self.args.quiz_share:
+                action = 'quiz'
+            elif roll < self.args.quiz_share + self.args.dont_know_share:
+                action = 'dont_know'
+            else:
+                action = 'know'
+            data = f'{action}_{word_id}'
+        elif 'main_menu' in buttons:
+            # Клавиатура после урока
+            user.lessons += 1
+            user.empty_menus = 0
+            self.lesson_times.append(now)
+            data = 'stats'
+        elif 'learn_today' in buttons:
+            # Главное меню: после уровня, после статистики или если слова кончились
+            user.empty_menus += 1
+            if user.lessons >= self.args.lessons or user.empty_menus > 2:
+                user.done = True
+                return None
+            data = 'learn_today'
+        else:
+            user.done = True
+            return None
+        return self._callback_update(user, data, now)
+
+    def _sent(self, user, label, now):
+        user.pending = label
+        user.sent_at = now
+        user.last_event = now
+        self.sent += 1
+
+    def _message_update(self, user, text, now):
+        from telegram import Update
+        self._sent(user, 'start', now)
+        return Update.de_json({
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._update_ids),
+                'date': int(time.time()),
+                'chat': {'id': user.user_id, 'type': 'private'},
+                'from': {'id': user.user_id, 'is_bot': False, 'first_name': f'User{user.user_id}'},
+                'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+            }
+        }, self.bot)
+
+    def _callback_update(self, user, data, now):
+        from telegram import Update
+        label = next(label for prefix, label in LABELS if data.startswith(prefix))
+        self._sent(user, label, now)
+        update_id = next(self._update_ids)
+        return Update.de_json({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': {'id': user.user_id, 'is_bot': False, 'first_name': f'User{user.user_id}'},
+                'chat_instance': str(user.user_id),
+                'data': data,
+                'message': {
+                    'message_id': user.message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': user.user_id, 'type': 'private'},
+                    'from': BOT_USER,
+                    'text': '...'
+                }
+            }
+        }, self.bot)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--words', type=int, default=5000, help="Generated dictionary size")
+    parser.add_argument('--lessons', type=int, default=1, help="Lessons per user")
+    parser.add_argument('--think', type=float, default=2.0, help="Mean think time between taps, seconds")
+    parser.add_argument('--ramp', type=float, default=20.0, help="Users start within this many seconds")
+    parser.add_argument('--duration', type=float, default=600.0, help="Hard stop, seconds")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Drop a user after this long without a reply")
+    parser.add_argument('--quiz-share', type=float, default=0.15)
+    parser.add_argument('--dont-know-share', type=float, default=0.25)
+    parser.add_argument('--api-latency', type=float, default=0.0, help="Fake Bot API latency, seconds")
+    parser.add_argument('--tts-latency', type=float, default=0.3, help="Fake speech synthesis time, seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'load.db')
+    os.environ['DICTIONARY_PATH'] = os.path.join(tmp, 'words.csv')
+    os.environ['VOICE_CACHE_DIR'] = os.path.join(tmp, 'voice_cache')
+    os.environ['BOT_TOKEN'] = TOKEN
+    os.environ.pop('WEBHOOK_URL', None)
+    os.chdir(tmp)
+
+    from config import Config
+    write_dictionary(os.environ['DICTIONARY_PATH'], args.words, list(Config.LEVELS))
+
+    started = time.perf_counter()
+    import handlers
+    import main as bot_main
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"{args.words} words imported and indexed in {time.perf_counter() - started:.1f}s")
+
+    def fake_synthesize(text, lang, slow):
+        # Синтез речи без сети: пауза и короткий файл в кэше
+        time.sleep(args.tts_latency)
+        voice = handlers.voice_manager
+        tmp_mp3 = voice.cache.temp_path('.mp3')
+        with open(tmp_mp3, 'wb') as f:
+            f.write(b'\xff\xfb' + os.urandom(512))
+        return voice.cache.put_file(voice.cache_key(text, lang, slow, 'mp3', 'gtts'), '.mp3', tmp_mp3)
+    handlers.voice_manager._synthesize = fake_synthesize
+
+    server = FakeTelegramServer(latency=args.api_latency)
+    server.start()
+    updater = bot_main.create_updater(base_url=server.base_url)
+    simulation = Simulation(updater.bot, updater.dispatcher.update_queue, args)
+    server.on_call = simulation.on_call
+
+    threading.Thread(target=updater.dispatcher.start, name='dispatcher', daemon=True).start()
+    updater.job_queue.start()
+
+    print(f"{args.users} users x {args.lessons} lessons, think {args.think}s, ramp {args.ramp}s, "
+          f"{Config.HANDLER_WORKERS} handler threads, {Config.DB_WORKERS} DB threads")
+    started = time.perf_counter()
+    simulation.start()
+    simulation.run()
+    elapsed = time.perf_counter() - started
+
+    with simulation._cond:
+        samples = {label: sorted(values) for label, values in simulation.samples.items()}
+        lessons = len(simulation.lesson_times)
+        done = sum(user.done for user in simulation.users.values())
+    calls = sum(server.calls.values())
+
+    print(f"{elapsed:.1f}s: {simulation.sent} updates ({simulation.sent / elapsed:.1f}/s), "
+          f"{calls} Bot API calls ({calls / elapsed:.1f}/s), {lessons} lessons completed")
+    if len(simulation.lesson_times) > 1:
+        window = simulation.lesson_times[-1] - simulation.lesson_times[0]
+        if window > 0:
+            print(f"lessons/s while lessons were finishing: {(lessons - 1) / window:.2f}")
+    print(f"users finished: {done}/{args.users}, dropped after {args.timeout:.0f}s without reply: {simulation.timeouts}")
+
+    print(f"{'handler':<26}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label in ['start'] + [label for prefix, label in LABELS]:
+        values = samples.get(label)
+        if not values:
+            continue
+        print(f"{label:<26}{len(values):>8}{percentile(values, 0.5):>10.1f}{percentile(values, 0.95):>10.1f}"
+              f"{percentile(values, 0.99):>10.1f}{values[-1] * 1000:>10.1f}")
+
+    stats = handlers.chat_executor.stats()
+    print(f"handler threads: failed {stats['failed']}, max wait {stats['wait_max'] * 1000:.0f} ms, "
+          f"max run {stats['latency_max'] * 1000:.0f} ms; DB pool calls {handlers.async_db.calls}; "
+          f"TTS {handlers.voice_manager.engine.metrics()['completed']} clips")
+
+    updater.job_queue.stop()
+    updater.dispatcher.stop()
+    server.stop()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Цена записи метрик: гистограмма на потоковых счетчиках (metrics.py)
+# против той же гистограммы под общим threading.Lock
+#
+#   python benchmarks/bench_metrics.py --threads 1 4 8 --observations 200000
+import argparse
+import bisect
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import LATENCY_BUCKETS, Histogram, render
+
+LABELS = ['learn_today', 'word_callback', 'test_answer', 'stats', 'settings']
+
+
+class LockedHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, key=''):
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+
+def run(histogram, threads, observations):
+    samples = [(random.expovariate(20), random.choice(LABELS)) for _ in range(1000)]
+
+    def worker():
+        observe = histogram.observe
+        for i in range(observations):
+            value, label = samples[i % 1000]
+            observe(value, label)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return (time.perf_counter() - started) / (threads * observations) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--observations', type=int, default=200000, help="Per thread")
+    args = parser.parse_args()
+
+    for threads in args.threads:
+        lock_free = run(Histogram(f'bench_lock_free_{threads}', 'bench', 'handler'), threads, args.observations)
+        locked = run(LockedHistogram(), threads, args.observations)
+        print(f"{threads} threads: per-thread counters {lock_free:6.0f} ns/observation | "
+              f"shared lock {locked:6.0f} ns/observation")
+
+    started = time.perf_counter()
+    text = render()
+    print(f"render: {len(text.splitlines())} lines in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Выбор новых слов: старый NOT IN по всему прогрессу пользователя против
+# курсора по (level_rank, frequency_rank)
+#
+#   python benchmarks/bench_new_words.py --words 200000 --learned 0 1000 10000 50000
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+from models import User, UserWordProgress, Word
+
+LEVELS = list(Config.LEVELS)
+
+
+def seed_words(db, words):
+    rows = [{
+        'word': f'word{i}', 'translation': f'слово{i}', 'transcription': None, 'example': None,
+        'example_translation': None, 'level': LEVELS[i % len(LEVELS)], 'part_of_speech': None,
+        'topic': None, 'frequency': (i * 7919) % 100000
+    } for i in range(words)]
+    for i in range(0, len(rows), 10000):
+        db.upsert_words(rows[i:i + 10000])
+    db.dictionary_changed()
+
+
+def learn(db_path, user_id, count):
+    # Пользователь уже видел первые count слов в порядке выдачи
+    conn = sqlite3.connect(db_path)
+    conn.execute('DELETE FROM user_word_progress WHERE user_id = ?', (user_id,))
+    conn.execute('''
+        INSERT INTO user_word_progress (user_id, word_id, stage, next_review)
+        SELECT ?, id, 0, '2100-01-01 00:00:00' FROM words
+        ORDER BY level_rank, frequency_rank LIMIT ?
+    ''', (user_id, count))
+    conn.commit()
+    conn.close()
+
+
+def old_query(session, user, count):
+    learned_ids = session.query(UserWordProgress.word_id).filter(
+        UserWordProgress.user_id == user.id
+    )
+    return session.query(Word).filter(
+        Word.level <= user.level,
+        ~Word.id.in_(learned_ids)
+    ).order_by(Word.frequency.desc()).limit(count).all()
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--words', type=int, default=200000)
+    parser.add_argument('--learned', type=int, nargs='+', default=[0, 1000, 10000, 50000])
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        Config.DICTIONARY_PATH = os.devnull
+        db = Database(db_path)
+        seed_words(db, args.words)
+        user_id = db.get_or_create_user(1, first_name='Bench').id
+        db.update_user(1, level='B2')
+
+        print(f"{args.words} words, {args.count} new words per call, user level B2")
+        for learned in args.learned:
+            learn(db_path, user_id, learned)
+            session = db.get_session()
+            user = session.query(User).get(user_id)
+
+            old_ms, _ = timed(lambda: old_query(session, user, args.count), args.repeat)
+
+            def frontier():
+                # Курсор каждый раз с нуля - худший случай, как после импорта слов
+                user.frontier_level, user.frontier_rank = 0, 0
+                return db.take_new_words(session, user, args.count)
+            cold_ms, _ = timed(frontier, max(1, args.repeat // 4))
+
+            def warm():
+                level, rank = user.frontier_level, user.frontier_rank
+                words = db.take_new_words(session, user, args.count)
+                user.frontier_level, user.frontier_rank = level, rank
+                return words
+            warm_ms, _ = timed(warm, args.repeat)
+
+            session.rollback()
+            session.close()
+            print(f"learned {learned:>6}: NOT IN {old_ms:8.2f} ms | "
+                  f"cursor {warm_ms:6.2f} ms | cursor after reset {cold_ms:8.2f} ms")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
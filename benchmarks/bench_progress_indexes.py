@@ -0,0 +1,123 @@
+# Сравнение планов и времени запросов к user_word_progress до и после миграции
+#
+#   python benchmarks/bench_progress_indexes.py --users 10000 --words 5000 --per-user 100
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+import migrations
+from database import Database
+from models import Base, UserWordProgress
+
+LEGACY_INDEXES = ['ix_user_word_progress_user_next_review', 'ux_user_word_progress_user_word']
+
+
+def seed(db_path, users, words, per_user):
+    conn = sqlite3.connect(db_path)
+    now = datetime.utcnow()
+    conn.executemany(
+        'INSERT INTO words (id, word, translation, level, frequency) VALUES (?, ?, ?, ?, ?)',
+        ((i, f'word{i}', f'слово{i}', 'A1', random.randint(1, 1000)) for i in range(1, words + 1))
+    )
+    conn.executemany(
+        'INSERT INTO users (id, telegram_id, level, daily_words, streak) VALUES (?, ?, ?, 10, 0)',
+        ((i, 1000000 + i, 'A1') for i in range(1, users + 1))
+    )
+
+    def progress_rows():
+        for user_id in range(1, users + 1):
+            for word_id in random.sample(range(1, words + 1), per_user):
+                next_review = now + timedelta(hours=random.randint(-72, 24 * 30))
+                yield user_id, word_id, random.randint(0, 5), next_review.isoformat(' ')
+
+    conn.executemany(
+        'INSERT INTO user_word_progress (user_id, word_id, stage, next_review) VALUES (?, ?, ?, ?)',
+        progress_rows()
+    )
+    conn.commit()
+    conn.close()
+
+
+def queries(session, user_id, word_id, now):
+    return {
+        'due words': Database.due_words_query(session, user_id, now).limit(10),
+        'due count': session.query(func.count(UserWordProgress.id)).filter(
+            UserWordProgress.user_id == user_id,
+            UserWordProgress.next_review <= now
+        ),
+        'progress lookup': session.query(UserWordProgress).filter_by(user_id=user_id, word_id=word_id),
+    }
+
+
+def explain(session, query):
+    compiled = query.statement.compile(session.bind, compile_kwargs={'literal_binds': True})
+    rows = session.execute(f'EXPLAIN QUERY PLAN {compiled}').fetchall()
+    return [row[-1] for row in rows]
+
+
+def run(engine, users, words, rounds):
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    now = datetime.utcnow()
+    try:
+        for name, query in queries(session, 1, 1, now).items():
+            print(f'  {name}:')
+            for line in explain(session, query):
+                print(f'    {line}')
+
+        sample = [(random.randint(1, users), random.randint(1, words)) for _ in range(rounds)]
+        for name in queries(session, 1, 1, now):
+            started = time.perf_counter()
+            for user_id, word_id in sample:
+                queries(session, user_id, word_id, now)[name].all()
+            elapsed = time.perf_counter() - started
+            print(f'  {name}: {elapsed / rounds * 1000:.3f} ms/query')
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--words', type=int, default=5000)
+    parser.add_argument('--per-user', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        engine = create_engine(f'sqlite:///{db_path}')
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for name in LEGACY_INDEXES:
+                conn.exec_driver_sql(f'DROP INDEX {name}')
+
+        started = time.perf_counter()
+        seed(db_path, args.users, args.words, args.per_user)
+        rows = args.users * args.per_user
+        print(f'Seeded {rows} progress rows in {time.perf_counter() - started:.1f}s')
+
+        print('Before migration:')
+        run(engine, args.users, args.words, args.rounds)
+
+        started = time.perf_counter()
+        migrations.upgrade(engine)
+        print(f'Migration took {time.perf_counter() - started:.1f}s')
+
+        print('After migration:')
+        run(engine, args.users, args.words, args.rounds)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Генерация тестов с индексом дистракторов: время построения индекса,
+# его размер и сколько тестов в секунду выдает QuizGenerator
+#
+#   python benchmarks/bench_quiz.py --words 200000 --quizzes 200000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+from quiz import QuizGenerator, DistractorIndex
+from records import WordRecord
+
+LEVELS = list(Config.LEVELS)
+PARTS = ['noun', 'verb', 'adjective', 'adverb', 'phrase']
+
+
+def seed_words(db, words):
+    rows = [{
+        'word': f'word{i}', 'translation': f'слово{i}', 'transcription': None,
+        'example': f'An example with word{i}.' if i % 3 else None, 'example_translation': None,
+        'level': LEVELS[i % len(LEVELS)], 'part_of_speech': PARTS[i % len(PARTS)],
+        'topic': f'topic{i % 40}', 'frequency': i % 1000
+    } for i in range(words)]
+    for i in range(0, len(rows), 10000):
+        db.upsert_words(rows[i:i + 10000])
+    db.dictionary_changed()
+
+
+def lesson_words(db, count):
+    session = db.get_session()
+    try:
+        rows = session.execute(
+            'SELECT id, word, translation, transcription, example, example_translation, '
+            'level, part_of_speech, topic, frequency FROM words ORDER BY random() LIMIT :n', {'n': count}
+        ).fetchall()
+    finally:
+        session.close()
+    return [WordRecord(*row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--words', type=int, default=200000)
+    parser.add_argument('--quizzes', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.DICTIONARY_PATH = os.devnull
+        db = Database(os.path.join(tmp, 'bench.db'))
+        seed_words(db, args.words)
+
+        index = DistractorIndex(db)
+        index.build()
+        stats = index.stats()
+        print(f"index: {stats['words']} words, {stats['groups']} groups, "
+              f"{stats['bytes'] / 1024 / 1024:.1f} MB, built in {stats['build_time']:.2f}s")
+
+        words = lesson_words(db, 1000)
+        lesson = words[:10]
+        generators = [
+            ('lesson words only', QuizGenerator(), lesson),
+            ('distractor index', QuizGenerator(index), None),
+        ]
+        for label, generator, context_words in generators:
+            junk = 0
+            started = time.perf_counter()
+            for i in range(args.quizzes):
+                word = words[i % len(words)]
+                quiz = generator.generate_quiz(word, context_words)
+                junk += any(option.startswith(('вариант_', 'word_')) for option in quiz.get('options', []))
+            elapsed = time.perf_counter() - started
+            print(f"{label:<18}: {args.quizzes / elapsed:>10,.0f} quizzes/s, "
+                  f"{junk / args.quizzes * 100:.1f}% with placeholder options")
+
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
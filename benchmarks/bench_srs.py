@@ -0,0 +1,45 @@
+# Скалярный и пакетный (NumPy) расчет интервалов SRS
+#
+#   python benchmarks/bench_srs.py --cards 1000000
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from srs import SRSManager
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=1000000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    stages = rng.integers(0, 6, args.cards)
+    qualities = rng.integers(0, 6, args.cards)
+    now = datetime.utcnow()
+    reviewed_at = np.full(args.cards, np.datetime64(now, 'us'))
+
+    scalar_cards = min(args.cards, 200000)
+    stage_list = stages[:scalar_cards].tolist()
+    quality_list = qualities[:scalar_cards].tolist()
+    started = time.perf_counter()
+    for stage, quality in zip(stage_list, quality_list):
+        SRSManager.schedule(stage, quality, now)
+    elapsed = time.perf_counter() - started
+    print(f'scalar: {scalar_cards} cards in {elapsed:.3f}s = {scalar_cards / elapsed / 1e6:.2f}M cards/s')
+
+    SRSManager.schedule_batch(stages[:10], qualities[:10], reviewed_at[:10])
+    started = time.perf_counter()
+    SRSManager.schedule_batch(stages, qualities, reviewed_at)
+    elapsed = time.perf_counter() - started
+    print(f'batch:  {args.cards} cards in {elapsed:.3f}s = {args.cards / elapsed / 1e6:.2f}M cards/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# Локальная заглушка Bot API для нагрузочного теста: принимает HTTP-запросы
+# python-telegram-bot, отвечает как Telegram и сообщает о каждом вызове
+# наблюдателю on_call(method, params, result)
+import email
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Wordich', 'username': 'wordich_bot'}
+
+SEND_METHODS = ('sendMessage', 'sendVoice', 'sendAudio', 'sendDocument')
+EDIT_METHODS = ('editMessageText', 'editMessageCaption', 'editMessageReplyMarkup')
+
+
+class FakeTelegramServer:
+    def __init__(self, latency=0.0, on_call=None):
+        self.latency = latency
+        self.on_call = on_call
+        self.calls = {}
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive: пул соединений urllib3 не переподключается на каждый вызов
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                server._handle(self)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_port}/bot'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name='fake-telegram', daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+    def _handle(self, request):
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        method = request.path.rsplit('/', 1)[-1]
+        params = self._parse(request.headers.get('Content-Type', ''), body)
+        if self.latency:
+            time.sleep(self.latency)
+
+        result = self._result(method, params)
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if self.on_call:
+            self.on_call(method, params, result)
+
+        payload = json.dumps({'ok': True, 'result': result}).encode()
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    @staticmethod
+    def _parse(content_type, body):
+        if content_type.startswith('multipart/form-data'):
+            # Загрузка голосового: нужны только текстовые поля
+            message = email.message_from_bytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+            params = {}
+            for part in message.get_payload():
+                name = part.get_param('name', header='content-disposition')
+                if not part.get_filename():
+                    params[name] = part.get_payload(decode=True).decode()
+            return params
+        return json.loads(body) if body else {}
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method in SEND_METHODS:
+            message = self._message(next(self._message_ids), params)
+            if method == 'sendVoice':
+                file_no = next(self._file_ids)
+                message['voice'] = {'file_id': f'voice{file_no}', 'file_unique_id': f'v{file_no}', 'duration': 1}
+            return message
+        if method in EDIT_METHODS:
+            return self._message(int(params.get('message_id') or 0), params)
+        return True
+
+    @staticmethod
+    def _message(message_id, params):
+        chat_id = int(params.get('chat_id') or 0)
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        if 'caption' in params:
+            message['caption'] = params['caption']
+        return message
+
+
+def keyboard(params):
+    # callback_data всех кнопок inline-клавиатуры из параметров вызова
+    markup = params.get('reply_markup')
+    if not markup:
+        return None
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    rows = markup.get('inline_keyboard')
+    if rows is None:
+        return None
+    return [button['callback_data'] for row in rows for button in row if 'callback_data' in button]
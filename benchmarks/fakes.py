@@ -0,0 +1,116 @@
+# Заглушки Telegram-объектов для бенчмарков обработчиков
+import itertools
+import threading
+import time
+
+_message_ids = itertools.count(1)
+_update_ids = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, chat_id, text=None):
+        self.message_id = next(_message_ids)
+        self.chat_id = chat_id
+        self.text = text
+        self.voice = None
+
+
+class FakeBot:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self, chat_id, text=None):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeMessage(chat_id, text)
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._call(chat_id, text)
+
+    def send_voice(self, chat_id, voice, **kwargs):
+        return self._call(chat_id)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return self._call(chat_id, text)
+
+    def delete_message(self, chat_id, message_id, **kwargs):
+        return self._call(chat_id)
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = f'user{user_id}'
+        self.first_name = 'Bench'
+        self.last_name = None
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot, user_id, data):
+        self.bot = bot
+        self.user_id = user_id
+        self.data = data
+        self.message = FakeMessage(user_id)
+
+    def answer(self, *args, **kwargs):
+        pass
+
+    def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        return self.bot.edit_message_text(text, chat_id=self.user_id, message_id=self.message.message_id)
+
+    def delete_message(self):
+        return self.bot.delete_message(self.user_id, self.message.message_id)
+
+
+class FakeUpdate:
+    def __init__(self, bot, user_id, data=None, text=None):
+        self.update_id = next(_update_ids)
+        self.effective_user = FakeUser(user_id)
+        self.callback_query = FakeCallbackQuery(bot, user_id, data) if data else None
+        self.message = None
+        if text is not None:
+            self.message = FakeMessage(user_id, text)
+            self.message.reply_text = lambda text, **kwargs: bot.send_message(user_id, text)
+
+
+class FakeJob:
+    def __init__(self, callback, context):
+        self.callback = callback
+        self.context = context
+        self.removed = False
+        self.timer = None
+
+    def schedule_removal(self):
+        self.removed = True
+        if self.timer:
+            self.timer.cancel()
+
+
+class FakeJobQueue:
+    def __init__(self, bot):
+        self.bot = bot
+        self.scheduled = 0
+
+    def run_once(self, callback, when, context=None, name=None):
+        job = FakeJob(callback, context)
+        job.timer = threading.Timer(when, self._run, (job,))
+        job.timer.daemon = True
+        job.timer.start()
+        self.scheduled += 1
+        return job
+
+    def _run(self, job):
+        if not job.removed:
+            job.callback(FakeContext(self.bot, self, job))
+
+
+class FakeContext:
+    def __init__(self, bot, job_queue=None, job=None):
+        self.bot = bot
+        self.job_queue = job_queue
+        self.job = job
+        self.user_data = {}
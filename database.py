@@ -1,22 +1,153 @@
 import os
-from sqlalchemy import create_engine, func
+import atexit
+import logging
+import threading
+from urllib.parse import quote
+from sqlalchemy import create_engine, event, func, and_, bindparam, select
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timedelta
-from models import Base, User, Word, UserWordProgress, UserStats
+from array import array
+from models import Base, User, Word, UserWordProgress, UserStats, LessonSessionState, VoiceFileId, SchedulerState
 from config import Config
+from review_journal import ReviewJournal
+from srs import SRSManager, QUALITY_CORRECT, QUALITY_WRONG
+from records import user_record, word_record, user_stats_record
+from lesson_sessions import LessonSession
+from dictionary import WORD_FIELDS, executemany, import_dictionary, rank_words
+from user_cache import UserCache, WordCache
+import migrations
+import metrics
+from sql_profiler import profiler
 
-class Database:
-    def __init__(self):
-        # SQLite база данных в файле
-        db_path = os.path.join(os.path.dirname(__file__), 'wordich.db')
-        self.engine = create_engine(
-            f'sqlite:///{db_path}?check_same_thread=False',
-            echo=False
+logger = logging.getLogger(__name__)
+
+# Запись в scheduler_state с моментом последнего изменения словаря
+DICTIONARY_STATE = 'dictionary'
+
+# Сколько слов искать одним IN в upsert_words (лимит параметров SQLite - 32766)
+UPSERT_LOOKUP_SIZE = 5000
+
+def _sqlite_pragmas(read_only=False):
+    # PRAGMA действуют на соединение, поэтому выполняются при каждом подключении.
+    # WAL: читатели не ждут писателя; с synchronous=NORMAL коммит не делает
+    # fsync, он происходит только на checkpoint
+    pragmas = [
+        f'busy_timeout = {Config.SQLITE_BUSY_TIMEOUT}',
+        f'synchronous = {Config.SQLITE_SYNCHRONOUS}',
+        f'mmap_size = {Config.SQLITE_MMAP_SIZE}',
+        f'cache_size = {Config.SQLITE_CACHE_SIZE}'
+    ]
+    if not read_only:
+        pragmas.insert(0, f'journal_mode = {Config.SQLITE_JOURNAL_MODE}')
+    
+    def on_connect(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(f'PRAGMA {pragma}')
+        cursor.close()
+    return on_connect
+
+def _insert(engine, table):
+    # INSERT с ON CONFLICT: конструкция есть у SQLite и PostgreSQL, у каждого своя
+    dialect = postgresql if engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
+
+def _instrument(engine):
+    metrics.instrument_engine(engine)
+    profiler.instrument(engine)
+
+def create_engines(db_path=None, url=None):
+    # (engine, read_engine). read_engine - отдельный пул read-only соединений
+    # для статистики; для серверной БД и in-memory SQLite это тот же engine
+    url = url or Config.DATABASE_URL
+    if url and make_url(url).get_backend_name() != 'sqlite':
+        engine = create_engine(
+            url,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=True
         )
+        _instrument(engine)
+        return engine, engine
+    
+    db_path = (make_url(url).database if url else db_path) or Config.DATABASE_PATH
+    connect_args = {'check_same_thread': False}
+    if db_path == ':memory:':
+        engine = create_engine('sqlite://', connect_args=connect_args, poolclass=StaticPool)
+        _instrument(engine)
+        return engine, engine
+    
+    engine = create_engine(
+        f'sqlite:///{db_path}',
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW
+    )
+    event.listen(engine, 'connect', _sqlite_pragmas())
+    _instrument(engine)
+    if not Config.SQLITE_READ_POOL_SIZE:
+        return engine, engine
+    
+    # mode=ro: файл открывается только на чтение, запись из этого пула невозможна
+    read_engine = create_engine(
+        f'sqlite:///file:{quote(os.path.abspath(db_path))}?mode=ro&uri=true',
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=Config.SQLITE_READ_POOL_SIZE,
+        max_overflow=0
+    )
+    event.listen(read_engine, 'connect', _sqlite_pragmas(read_only=True))
+    _instrument(read_engine)
+    return engine, read_engine
+
+class Database:
+    def __init__(self, db_path=None, url=None):
+        # SQLite в файле (DATABASE_PATH) или серверная БД (DATABASE_URL)
+        self.engine, self.read_engine = create_engines(db_path, url)
         Base.metadata.create_all(self.engine)
+        migrations.upgrade(self.engine)
         self.Session = sessionmaker(bind=self.engine)
+        # Только для чтения статистики, без ожидания писателей
+        self.ReadSession = sessionmaker(bind=self.read_engine)
+        
+        self.user_cache = UserCache(
+            max_size=Config.USER_CACHE_SIZE,
+            ttl=Config.USER_CACHE_TTL
+        )
+        self.word_cache = WordCache(max_size=Config.WORD_CACHE_SIZE)
+        self.voice_file_ids = None
+        self._voice_lock = threading.Lock()
+        self._level_totals = None
+        
+        # Вызываются как listener(old_record, new_record) при создании
+        # пользователя (old_record=None) и изменении его настроек
+        self.user_listeners = []
+        # Коммит изменения пользователя и вызов user_listeners идут под этой
+        # блокировкой: подписчик, который под ней же подписывается и читает
+        # начальное состояние, не пропустит изменение и не учтет его дважды
+        self.user_change_lock = threading.RLock()
+        # Вызываются без аргументов после изменения словаря в этом процессе
+        self.dictionary_listeners = []
         
         self.init_dictionary()
+        
+        self.review_journal = ReviewJournal(
+            self.apply_reviews,
+            flush_interval=Config.REVIEW_FLUSH_INTERVAL,
+            max_batch=Config.REVIEW_BATCH_SIZE
+        )
+        self.review_journal.start()
+        atexit.register(self.close)
+    
+    def close(self):
+        self.review_journal.stop()
+        self.read_engine.dispose()
+        self.engine.dispose()
     
     def get_session(self):
         return self.Session()
@@ -24,111 +155,194 @@ class Database:
     def init_dictionary(self):
         session = self.get_session()
         try:
-            if session.query(Word).count() > 0:
+            if session.query(Word.id).first() is not None:
                 return
+        finally:
+            session.close()
+        
+        try:
+            report = import_dictionary(self, Config.DICTIONARY_PATH)
+            print(f"Dictionary initialized with {report['inserted']} words")
+        except Exception as e:
+            print(f"Error initializing dictionary: {e}")
+    
+    def upsert_words(self, rows):
+        # rows - dict с полями WORD_FIELDS, без повторов (word, level).
+        # Новые слова вставляются, у существующих переписываются только
+        # изменившиеся; id при этом не меняется, прогресс пользователей не трогаем.
+        # Новые и изменившиеся строки определяются сравнением с текущими
+        # строками пачки, так что счетчики точны на любой БД.
+        # Возвращает (вставлено, обновлено)
+        if not rows:
+            return 0, 0
+        
+        words = Word.__table__
+        changed_fields = [f for f in WORD_FIELDS if f not in ('word', 'level')]
+        
+        with self.engine.begin() as conn:
+            existing = {}
+            names = list({row['word'] for row in rows})
+            for start in range(0, len(names), UPSERT_LOOKUP_SIZE):
+                for found in conn.execute(
+                    select(words.c.id, words.c.word, words.c.level, *(words.c[f] for f in changed_fields))
+                    .where(words.c.word.in_(names[start:start + UPSERT_LOOKUP_SIZE]))
+                ):
+                    existing[(found[1], found[2])] = (found[0], tuple(found[3:]))
             
-            words_data = [
-                # A1 - Базовые слова
-                ("hello", "привет", "həˈləʊ", "Hello, how are you?", "Привет, как дела?", "A1", "interjection", "greetings", 1000),
-                ("goodbye", "до свидания", "ɡʊdˈbaɪ", "Say goodbye to your friends.", "Попрощайся с друзьями.", "A1", "interjection", "greetings", 900),
-                ("please", "пожалуйста", "pliːz", "Please sit down.", "Пожалуйста, садитесь.", "A1", "adverb", "politeness", 950),
-                ("thank you", "спасибо", "θæŋk juː", "Thank you for your help.", "Спасибо за помощь.", "A1", "phrase", "politeness", 980),
-                ("yes", "да", "jes", "Yes, I understand.", "Да, я понимаю.", "A1", "adverb", "basics", 990),
-                ("no", "нет", "nəʊ", "No, I don't want.", "Нет, я не хочу.", "A1", "adverb", "basics", 990),
-                ("cat", "кот", "kæt", "The cat is sleeping.", "Кот спит.", "A1", "noun", "animals", 800),
-                ("dog", "собака", "dɒɡ", "The dog is barking.", "Собака лает.", "A1", "noun", "animals", 850),
-                ("house", "дом", "haʊs", "This is my house.", "Это мой дом.", "A1", "noun", "home", 880),
-                ("car", "машина", "kɑː", "He has a red car.", "У него красная машина.", "A1", "noun", "transport", 820),
-                ("book", "книга", "bʊk", "I read a book.", "Я читаю книгу.", "A1", "noun", "education", 780),
-                ("pen", "ручка", "pen", "Give me a pen.", "Дай мне ручку.", "A1", "noun", "education", 700),
-                ("water", "вода", "ˈwɔːtə", "I need water.", "Мне нужна вода.", "A1", "noun", "food", 850),
-                ("food", "еда", "fuːd", "The food is good.", "Еда хорошая.", "A1", "noun", "food", 860),
-                ("school", "школа", "skuːl", "I go to school.", "Я иду в школу.", "A1", "noun", "education", 800),
-                
-                # A2 - Повседневные слова
-                ("beautiful", "красивый", "ˈbjuːtɪfəl", "What a beautiful day!", "Какой прекрасный день!", "A2", "adjective", "description", 750),
-                ("interesting", "интересный", "ˈɪntrəstɪŋ", "This book is interesting.", "Эта книга интересная.", "A2", "adjective", "description", 740),
-                ("restaurant", "ресторан", "ˈrestrɒnt", "Let's go to a restaurant.", "Пойдем в ресторан.", "A2", "noun", "food", 720),
-                ("hospital", "больница", "ˈhɒspɪtəl", "She works in a hospital.", "Она работает в больнице.", "A2", "noun", "places", 680),
-                ("weather", "погода", "ˈweðə", "The weather is nice today.", "Погода сегодня хорошая.", "A2", "noun", "nature", 710),
-                ("travel", "путешествовать", "ˈtrævəl", "I love to travel.", "Я люблю путешествовать.", "A2", "verb", "travel", 730),
-                ("cook", "готовить", "kʊk", "Can you cook Italian food?", "Ты умеешь готовить итальянскую еду?", "A2", "verb", "food", 690),
-                ("expensive", "дорогой", "ɪkˈspensɪv", "This phone is expensive.", "Этот телефон дорогой.", "A2", "adjective", "shopping", 700),
-                ("cheap", "дешевый", "tʃiːp", "This hotel is cheap.", "Этот отель дешевый.", "A2", "adjective", "shopping", 680),
-                ("friendly", "дружелюбный", "ˈfrendli", "The people here are friendly.", "Люди здесь дружелюбные.", "A2", "adjective", "people", 720),
-                
-                # B1 - Средний уровень
-                ("achieve", "достигать", "əˈtʃiːv", "You can achieve anything.", "Ты можешь достичь всего.", "B1", "verb", "success", 650),
-                ("benefit", "польза", "ˈbenɪfɪt", "Regular exercise has many benefits.", "Регулярные упражнения приносят много пользы.", "B1", "noun", "health", 630),
-                ("challenge", "вызов", "ˈtʃælɪndʒ", "Learning a language is a challenge.", "Изучение языка - это вызов.", "B1", "noun", "learning", 640),
-                ("develop", "развивать", "dɪˈveləp", "We need to develop new skills.", "Нам нужно развивать новые навыки.", "B1", "verb", "growth", 660),
-                ("environment", "окружающая среда", "ɪnˈvaɪrənmənt", "We must protect the environment.", "Мы должны защищать окружающую среду.", "B1", "noun", "nature", 620),
-                ("government", "правительство", "ˈɡʌvənmənt", "The government makes laws.", "Правительство создает законы.", "B1", "noun", "politics", 600),
-                ("important", "важный", "ɪmˈpɔːtnt", "This is very important.", "Это очень важно.", "B1", "adjective", "basics", 700),
-                ("knowledge", "знания", "ˈnɒlɪdʒ", "Knowledge is power.", "Знания - сила.", "B1", "noun", "learning", 680),
-                ("language", "язык", "ˈlæŋɡwɪdʒ", "English is a global language.", "Английский - глобальный язык.", "B1", "noun", "learning", 710),
-                ("opportunity", "возможность", "ˌɒpəˈtjuːnəti", "Take every opportunity.", "Используй каждую возможность.", "B1", "noun", "success", 650),
-                
-                # B2 - Выше среднего
-                ("accommodation", "жилье", "əˌkɒməˈdeɪʃn", "We need to find accommodation.", "Нам нужно найти жилье.", "B2", "noun", "travel", 550),
-                ("approximately", "приблизительно", "əˈprɒksɪmətli", "Approximately 100 people came.", "Пришло приблизительно 100 человек.", "B2", "adverb", "numbers", 520),
-                ("consequence", "последствие", "ˈkɒnsɪkwəns", "Think about the consequences.", "Подумай о последствиях.", "B2", "noun", "logic", 530),
-                ("demonstrate", "демонстрировать", "ˈdemənstreɪt", "Let me demonstrate how it works.", "Позволь мне продемонстрировать, как это работает.", "B2", "verb", "teaching", 540),
-                ("especially", "особенно", "ɪˈspeʃəli", "I love fruits, especially apples.", "Я люблю фрукты, особенно яблоки.", "B2", "adverb", "emphasis", 560),
-                ("furthermore", "кроме того", "ˌfɜːðəˈmɔː", "Furthermore, we need more time.", "Кроме того, нам нужно больше времени.", "B2", "adverb", "writing", 510),
-                ("generally", "в целом", "ˈdʒenrəli", "Generally, it's a good idea.", "В целом, это хорошая идея.", "B2", "adverb", "opinion", 520),
-                ("however", "однако", "haʊˈevə", "However, we must be careful.", "Однако мы должны быть осторожны.", "B2", "adverb", "contrast", 580),
-                ("incredible", "невероятный", "ɪnˈkredəbl", "That's incredible news!", "Это невероятные новости!", "B2", "adjective", "emotion", 550),
-                ("nevertheless", "тем не менее", "ˌnevəðəˈles", "Nevertheless, we succeeded.", "Тем не менее, мы добились успеха.", "B2", "adverb", "contrast", 500),
-            ]
+            # Строки идут в драйвер без обработки SQLAlchemy - дату приводим сами
+            created_at = datetime.utcnow()
+            process = words.c.created_at.type.bind_processor(conn.dialect)
+            if process:
+                created_at = process(created_at)
+            new_rows = []
+            updates = []
+            for row in rows:
+                found = existing.get((row['word'], row['level']))
+                if found is None:
+                    new_rows.append(dict(row, created_at=created_at))
+                    continue
+                word_id, current = found
+                values = tuple(row[f] for f in changed_fields)
+                if values != current:
+                    update = {f'new_{f}': value for f, value in zip(changed_fields, values)}
+                    update['word_id'] = word_id
+                    updates.append(update)
             
-            for wd in words_data:
-                word = Word(
-                    word=wd[0], translation=wd[1], transcription=wd[2],
-                    example=wd[3], example_translation=wd[4], level=wd[5],
-                    part_of_speech=wd[6], topic=wd[7], frequency=wd[8]
+            if new_rows:
+                # Слово мог одновременно вставить другой импорт - оставляем его строку
+                columns = WORD_FIELDS + ('created_at',)
+                executemany(
+                    conn,
+                    _insert(self.engine, words).inline()
+                    .values({c: bindparam(c) for c in columns})
+                    .on_conflict_do_nothing(index_elements=['word', 'level']),
+                    new_rows
                 )
-                session.add(word)
-            
-            session.commit()
-            print(f"Dictionary initialized with {len(words_data)} words")
-            
-        except Exception as e:
-            session.rollback()
-            print(f"Error initializing dictionary: {e}")
-        finally:
-            session.close()
+            if updates:
+                executemany(
+                    conn,
+                    words.update().where(words.c.id == bindparam('word_id')).values(
+                        {f: bindparam(f'new_{f}') for f in changed_fields}
+                    ),
+                    updates
+                )
+        return len(new_rows), len(updates)
+    
+    def dictionary_changed(self):
+        # Вызывать после любого изменения таблицы words
+        self.word_cache.clear()
+        self._level_totals = None
+        
+        with self.engine.begin() as conn:
+            if rank_words(conn):
+                # Новые слова или слова со сменившейся частотой могли встать позади
+                # курсоров - пользователи один раз пройдут порядок заново,
+                # пропуская известные слова
+                conn.execute(User.__table__.update().values(frontier_level=0, frontier_rank=0))
+        
+        # Отметка для других процессов (бот узнает об импорте из import_words.py)
+        self.set_scheduler_last_run(DICTIONARY_STATE, datetime.utcnow())
+        for listener in self.dictionary_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Dictionary listener error: {e}")
+    
+    def get_dictionary_version(self):
+        return self.get_scheduler_last_run(DICTIONARY_STATE)
+    
+    def get_level_totals(self):
+        # Число слов на каждом уровне, одно на процесс
+        totals = self._level_totals
+        if totals is None:
+            session = self.ReadSession()
+            try:
+                totals = dict(session.query(Word.level, func.count(Word.id)).group_by(Word.level))
+            finally:
+                session.close()
+            self._level_totals = totals
+        return totals
     
     def get_or_create_user(self, telegram_id, username=None, first_name=None, last_name=None):
+        record = self.user_cache.get(telegram_id)
+        if record:
+            return record
+        
         session = self.get_session()
         try:
             user = session.query(User).filter_by(telegram_id=telegram_id).first()
             
             if not user:
-                user = User(
-                    telegram_id=telegram_id,
-                    username=username,
-                    first_name=first_name,
-                    last_name=last_name
-                )
-                session.add(user)
-                session.flush()
+                # Блокировку берем до первой записи, как update_user: ждать ее
+                # с открытой транзакцией записи нельзя, иначе update_user под
+                # этой же блокировкой встанет на блокировке записи SQLite
+                with self.user_change_lock:
+                    user = session.query(User).filter_by(telegram_id=telegram_id).first()
+                    created = user is None
+                    if created:
+                        user = User(
+                            telegram_id=telegram_id,
+                            username=username,
+                            first_name=first_name,
+                            last_name=last_name
+                        )
+                        session.add(user)
+                        session.flush()
+                        
+                        stats = UserStats(user_id=user.id)
+                        session.add(stats)
+                        session.commit()
+                        self._notify_user_listeners(None, user_record(user))
                 
-                stats = UserStats(user_id=user.id)
-                session.add(stats)
+                if created:
+                    self.assign_initial_words(session, user)
+            
+            record = user_record(user)
+            self.user_cache.put(record)
+            return record
+        finally:
+            session.close()
+    
+    def update_user(self, telegram_id, **fields):
+        # Чтение старых настроек тоже под блокировкой: два одновременных
+        # изменения одного пользователя иначе сообщили бы одно и то же old_record
+        session = self.get_session()
+        try:
+            with self.user_change_lock:
+                user = session.query(User).filter_by(telegram_id=telegram_id).first()
+                if not user:
+                    return None
+                
+                old_record = user_record(user)
+                for name, value in fields.items():
+                    setattr(user, name, value)
                 session.commit()
                 
-                self.assign_initial_words(session, user.id)
-            
-            return user
+                self.user_cache.invalidate(telegram_id)
+                record = user_record(user)
+                self.user_cache.put(record)
+                self._notify_user_listeners(old_record, record)
+            return record
         finally:
             session.close()
     
-    def assign_initial_words(self, session, user_id, count=50):
-        words = session.query(Word).filter_by(level='A1').limit(count).all()
+    def _notify_user_listeners(self, old_record, record):
+        for listener in self.user_listeners:
+            try:
+                listener(old_record, record)
+            except Exception as e:
+                logger.error(f"User listener error: {e}")
+    
+    def toggle_user_flag(self, telegram_id, name):
+        record = self.get_or_create_user(telegram_id)
+        return self.update_user(telegram_id, **{name: not getattr(record, name)})
+    
+    def assign_initial_words(self, session, user, count=50):
+        # Первые слова A1 по частоте
+        words = self.take_new_words(session, user, count, max_rank=0)
         for word in words:
             progress = UserWordProgress(
-                user_id=user_id,
+                user_id=user.id,
                 word_id=word.id,
                 stage=0,
                 next_review=datetime.utcnow()
@@ -136,7 +350,44 @@ class Database:
             session.add(progress)
         session.commit()
     
+    def take_new_words(self, session, user, count, max_rank=None):
+        # Новые слова идут в порядке (level_rank, frequency_rank), у пользователя
+        # хранится курсор - последняя выданная позиция. Каждый уровень - поиск по
+        # индексу ix_words_frontier от курсора; уже известные пользователю слова
+        # впереди курсора (после сброса курсора) отсеиваются по (user_id, word_id).
+        # Курсор сдвигается в той же сессии, коммитит вызывающий
+        if max_rank is None:
+            max_rank = Config.LEVEL_RANKS.get(user.level, 0)
+        
+        seen = session.query(UserWordProgress.id).filter(
+            UserWordProgress.user_id == user.id,
+            UserWordProgress.word_id == Word.id
+        ).exists()
+        
+        words = []
+        level = user.frontier_level or 0
+        rank = user.frontier_rank or 0
+        while level <= max_rank and len(words) < count:
+            needed = count - len(words)
+            batch = session.query(Word).filter(
+                Word.level_rank == level,
+                Word.frequency_rank > rank,
+                ~seen
+            ).order_by(Word.frequency_rank).limit(needed).all()
+            words.extend(batch)
+            
+            if len(batch) < needed:
+                # Уровень пройден до конца
+                level, rank = level + 1, 0
+            else:
+                rank = batch[-1].frequency_rank
+        
+        user.frontier_level = level
+        user.frontier_rank = rank
+        return words
+    
     def get_daily_words(self, user_id, count=None):
+        self.review_journal.flush(user_id)
         session = self.get_session()
         try:
             user = session.query(User).get(user_id)
@@ -145,25 +396,10 @@ class Database:
             
             count = count or user.daily_words
             
-            due_words = session.query(Word).join(UserWordProgress).filter(
-                UserWordProgress.user_id == user_id,
-                UserWordProgress.next_review <= datetime.utcnow()
-            ).order_by(
-                UserWordProgress.next_review,
-                UserWordProgress.stage
-            ).limit(count).all()
+            due_words = self.due_words_query(session, user_id, datetime.utcnow()).limit(count).all()
             
             if len(due_words) < count:
-                learned_ids = session.query(UserWordProgress.word_id).filter(
-                    UserWordProgress.user_id == user_id
-                ).subquery()
-                
-                new_words = session.query(Word).filter(
-                    Word.level <= user.level,
-                    ~Word.id.in_(learned_ids)
-                ).order_by(
-                    Word.frequency.desc()
-                ).limit(count - len(due_words)).all()
+                new_words = self.take_new_words(session, user, count - len(due_words))
                 
                 for word in new_words:
                     progress = UserWordProgress(
@@ -177,67 +413,228 @@ class Database:
                 session.commit()
                 due_words.extend(new_words)
             
-            return due_words
+            records = [word_record(w) for w in due_words]
+            self.word_cache.put_many(records)
+            return records
             
         finally:
             session.close()
     
+    def get_words(self, word_ids):
+        found = self.word_cache.get_many(word_ids)
+        missing = [i for i in word_ids if i not in found]
+        if missing:
+            session = self.get_session()
+            try:
+                records = [word_record(w) for w in session.query(Word).filter(Word.id.in_(missing))]
+            finally:
+                session.close()
+            self.word_cache.put_many(records)
+            found.update((r.id, r) for r in records)
+        return [found[i] for i in word_ids if i in found]
+    
+    def get_word(self, word_id):
+        words = self.get_words([word_id])
+        return words[0] if words else None
+    
+    @staticmethod
+    def due_words_query(session, user_id, now):
+        # Только равенство по user_id, диапазон и сортировка по next_review -
+        # запрос целиком идет по индексу (user_id, next_review) без сортировки
+        return session.query(Word).join(UserWordProgress).filter(
+            UserWordProgress.user_id == user_id,
+            UserWordProgress.next_review <= now
+        ).order_by(
+            UserWordProgress.next_review
+        )
+    
+    def get_notification_buckets(self):
+        # (notification_time, timezone, число пользователей) для включенных уведомлений
+        session = self.get_session()
+        try:
+            return session.query(
+                User.notification_time,
+                User.timezone,
+                func.count(User.id)
+            ).filter(
+                User.notification_enabled == True
+            ).group_by(User.notification_time, User.timezone).all()
+        finally:
+            session.close()
+    
+    def get_scheduler_last_run(self, name):
+        session = self.get_session()
+        try:
+            state = session.query(SchedulerState).get(name)
+            return state.last_run if state else None
+        finally:
+            session.close()
+    
+    def set_scheduler_last_run(self, name, last_run):
+        session = self.get_session()
+        try:
+            session.merge(SchedulerState(name=name, last_run=last_run))
+            session.commit()
+        finally:
+            session.close()
+    
+    def get_notification_targets(self, notification_time, timezone='UTC', now=None):
+        # Один запрос на всю минуту: (telegram_id, число слов к повторению)
+        # для пользователей с уведомлениями на это время, 0 - повторять нечего
+        now = now or datetime.utcnow()
+        session = self.ReadSession()
+        try:
+            return session.query(
+                User.telegram_id,
+                func.count(UserWordProgress.id)
+            ).outerjoin(
+                UserWordProgress,
+                and_(
+                    UserWordProgress.user_id == User.id,
+                    UserWordProgress.next_review <= now
+                )
+            ).filter(
+                User.notification_enabled == True,
+                User.notification_time == notification_time,
+                User.timezone == timezone
+            ).group_by(User.id).all()
+        finally:
+            session.close()
+    
     def update_word_progress(self, user_id, word_id, correct):
+        # Запись откладывается, фоновый поток применит ее пачкой
+        self.review_journal.submit(user_id, word_id, correct)
+    
+    def apply_reviews(self, events):
         session = self.get_session()
         try:
-            progress = session.query(UserWordProgress).filter_by(
-                user_id=user_id, word_id=word_id
-            ).first()
+            user_ids = {e.user_id for e in events}
+            word_ids = {e.word_id for e in events}
             
-            if not progress:
-                progress = UserWordProgress(
-                    user_id=user_id,
-                    word_id=word_id
-                )
-                session.add(progress)
+            users = {u.id: u for u in session.query(User).filter(User.id.in_(user_ids))}
+            stats = {s.user_id: s for s in session.query(UserStats).filter(UserStats.user_id.in_(user_ids))}
+            levels = {w.id: w.level for w in self.get_words(list(word_ids))}
+            progress = {}
+            for p in session.query(UserWordProgress).filter(
+                UserWordProgress.user_id.in_(user_ids),
+                UserWordProgress.word_id.in_(word_ids)
+            ):
+                progress.setdefault((p.user_id, p.word_id), p)
             
-            stats = session.query(UserStats).filter_by(user_id=user_id).first()
-            if not stats:
-                stats = UserStats(user_id=user_id)
-                session.add(stats)
+            schedules = self._schedule_reviews(events, progress)
             
-            stats.total_reviews += 1
-            if correct:
-                stats.correct_reviews += 1
-                progress.correct_count += 1
-                progress.stage = min(progress.stage + 1, Config.MAX_STAGE)
-                
-                if progress.stage == 1:
-                    interval = 1
-                elif progress.stage == 2:
-                    interval = 3
-                elif progress.stage == 3:
-                    interval = 7
-                elif progress.stage == 4:
-                    interval = 14
-                elif progress.stage == 5:
-                    interval = 30
-                    if not progress.mastered_at:
-                        progress.mastered_at = datetime.utcnow()
-                        stats.total_words_learned += 1
-                else:
-                    interval = 0
-            else:
-                stats.correct_reviews = max(0, stats.correct_reviews - 1)
-                progress.wrong_count += 1
-                progress.stage = max(0, progress.stage - 2)
-                interval = 0.25
+            # События одного пользователя применяются по порядку к одним и тем же
+            # объектам, так что статистика и серия пишутся один раз на пачку
+            streaks = {u.id: u.streak for u in users.values()}
+            for event, schedule in zip(events, schedules):
+                self._apply_review(session, event, schedule, users, stats, progress, levels)
             
-            progress.review_count += 1
-            progress.last_reviewed = datetime.utcnow()
+            changed = [u.telegram_id for u in users.values() if u.streak != streaks[u.id]]
+            session.commit()
             
-            if interval > 0:
-                progress.next_review = datetime.utcnow() + timedelta(days=interval)
-            else:
-                progress.next_review = datetime.utcnow() + timedelta(hours=6)
+            for telegram_id in changed:
+                self.user_cache.invalidate(telegram_id)
             
-            user = session.query(User).get(user_id)
-            today = datetime.utcnow().date()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    @staticmethod
+    def _schedule_reviews(events, progress_by_key):
+        # Стадии и даты повторения для всей пачки через SRSManager.schedule_batch.
+        # Повторные ответы на одно слово зависят от предыдущего, поэтому пачка
+        # считается волнами: в k-й волне - k-й ответ на каждое слово.
+        # Возвращает [(старая стадия, новая стадия, next_review)] по порядку events
+        stages = {}
+        waves = []
+        seen = {}
+        for i, event in enumerate(events):
+            key = (event.user_id, event.word_id)
+            if key not in stages:
+                progress = progress_by_key.get(key)
+                stages[key] = progress.stage if progress else 0
+            wave = seen.get(key, 0)
+            seen[key] = wave + 1
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(i)
+        
+        schedules = [None] * len(events)
+        for wave in waves:
+            keys = [(events[i].user_id, events[i].word_id) for i in wave]
+            old_stages = [stages[key] for key in keys]
+            new_stages, next_reviews = SRSManager.schedule_batch(
+                old_stages,
+                [QUALITY_CORRECT if events[i].correct else QUALITY_WRONG for i in wave],
+                [events[i].reviewed_at for i in wave]
+            )
+            for i, key, old_stage, new_stage, next_review in zip(
+                    wave, keys, old_stages, new_stages.tolist(), next_reviews.tolist()):
+                stages[key] = new_stage
+                schedules[i] = (old_stage, new_stage, next_review)
+        return schedules
+    
+    def _apply_review(self, session, event, schedule, users, stats_by_user, progress_by_key, levels):
+        user_id, word_id, correct, now = event
+        old_stage, new_stage, next_review = schedule
+        
+        progress = progress_by_key.get((user_id, word_id))
+        if not progress:
+            progress = UserWordProgress(
+                user_id=user_id,
+                word_id=word_id,
+                stage=0,
+                correct_count=0,
+                wrong_count=0,
+                review_count=0
+            )
+            session.add(progress)
+            progress_by_key[(user_id, word_id)] = progress
+        
+        stats = stats_by_user.get(user_id)
+        if not stats:
+            stats = UserStats(
+                user_id=user_id,
+                total_reviews=0,
+                correct_reviews=0,
+                total_words_learned=0,
+                level_learned={},
+                current_streak=0,
+                longest_streak=0
+            )
+            session.add(stats)
+            stats_by_user[user_id] = stats
+        
+        stats.total_reviews += 1
+        if correct:
+            stats.correct_reviews += 1
+            progress.correct_count += 1
+        else:
+            stats.correct_reviews = max(0, stats.correct_reviews - 1)
+            progress.wrong_count += 1
+        
+        was_learned = old_stage >= Config.LEARNED_STAGE
+        progress.stage, progress.next_review = new_stage, next_review
+        
+        # Счетчик выученных по уровню меняется, только когда слово пересекает LEARNED_STAGE
+        is_learned = progress.stage >= Config.LEARNED_STAGE
+        level = levels.get(word_id)
+        if is_learned != was_learned and level:
+            level_learned = dict(stats.level_learned or {})
+            level_learned[level] = max(0, level_learned.get(level, 0) + (1 if is_learned else -1))
+            stats.level_learned = level_learned
+        progress.review_count += 1
+        progress.last_reviewed = now
+        
+        if progress.stage == Config.MAX_STAGE and not progress.mastered_at:
+            progress.mastered_at = now
+            stats.total_words_learned += 1
+        
+        user = users.get(user_id)
+        if user:
+            today = now.date()
             if user.last_active.date() == today - timedelta(days=1):
                 user.streak += 1
                 stats.current_streak = user.streak
@@ -247,55 +644,182 @@ class Database:
                 user.streak = 1
                 stats.current_streak = 1
             
-            user.last_active = datetime.utcnow()
+            user.last_active = now
+        
+        # JSON-колонка не отслеживает изменения на месте - присваиваем новый список
+        activity = list(stats.last_week_activity or [0] * 7)
+        activity[now.weekday()] += 1
+        stats.last_week_activity = activity
+    
+    def get_user_stats(self, user_id):
+        self.review_journal.flush(user_id)
+        # До открытия сессии: get_level_totals берет свое соединение из того же пула
+        totals = self.get_level_totals()
+        session = self.ReadSession()
+        try:
+            # Один запрос: пользователь, его статистика и число слов к повторению
+            # (последнее считается по индексу (user_id, next_review))
+            due_today = session.query(func.count(UserWordProgress.id)).filter(
+                UserWordProgress.user_id == user_id,
+                UserWordProgress.next_review <= datetime.utcnow() + timedelta(days=1)
+            ).scalar_subquery()
+            row = session.query(User, UserStats, due_today).join(
+                UserStats, UserStats.user_id == User.id
+            ).filter(User.id == user_id).first()
             
-            weekday = datetime.utcnow().weekday()
-            if stats.last_week_activity:
-                stats.last_week_activity[weekday] += 1
+            if not row:
+                return None
+            user, stats, due_today = row
             
-            session.commit()
+            level_totals = [(level, totals.get(level, 0)) for level in Config.LEVELS]
+            return user_stats_record(user, stats, due_today, level_totals)
             
-        except Exception as e:
-            session.rollback()
-            raise e
         finally:
             session.close()
     
-    def get_user_stats(self, user_id):
+    def rebuild_stats_counters(self, fix=True):
+        # Пересчет счетчиков user_stats с нуля по user_word_progress.
+        # Возвращает расхождения [(user_id, поле, было, стало)]
+        self.review_journal.flush()
+        self._level_totals = None
         session = self.get_session()
         try:
-            user = session.query(User).get(user_id)
-            stats = session.query(UserStats).filter_by(user_id=user_id).first()
+            level_learned = {}
+            for user_id, level, learned in session.query(
+                UserWordProgress.user_id, Word.level, func.count(UserWordProgress.id)
+            ).join(Word, Word.id == UserWordProgress.word_id).filter(
+                UserWordProgress.stage >= Config.LEARNED_STAGE
+            ).group_by(UserWordProgress.user_id, Word.level):
+                level_learned.setdefault(user_id, {})[level] = learned
             
-            if not user or not stats:
-                return None
+            mastered = dict(session.query(
+                UserWordProgress.user_id, func.count(UserWordProgress.id)
+            ).filter(UserWordProgress.mastered_at.isnot(None)).group_by(UserWordProgress.user_id))
             
-            level_progress = {}
-            for level in Config.LEVELS:
-                total = session.query(Word).filter_by(level=level).count()
-                learned = session.query(UserWordProgress).join(Word).filter(
-                    UserWordProgress.user_id == user_id,
-                    Word.level == level,
-                    UserWordProgress.stage >= 3
-                ).count()
-                level_progress[level] = {
-                    'total': total,
-                    'learned': learned,
-                    'percent': (learned / total * 100) if total > 0 else 0
-                }
+            mismatches = []
+            for stats in session.query(UserStats):
+                expected = level_learned.get(stats.user_id, {})
+                stored = {level: n for level, n in (stats.level_learned or {}).items() if n}
+                if stored != expected:
+                    mismatches.append((stats.user_id, 'level_learned', stored, expected))
+                    if fix:
+                        stats.level_learned = expected
+                
+                expected = mastered.get(stats.user_id, 0)
+                if (stats.total_words_learned or 0) != expected:
+                    mismatches.append((stats.user_id, 'total_words_learned', stats.total_words_learned, expected))
+                    if fix:
+                        stats.total_words_learned = expected
             
-            due_today = session.query(UserWordProgress).filter(
-                UserWordProgress.user_id == user_id,
-                UserWordProgress.next_review <= datetime.utcnow() + timedelta(days=1)
-            ).count()
+            if fix:
+                session.commit()
+            return mismatches
             
-            return {
-                'user': user,
-                'stats': stats,
-                'level_progress': level_progress,
-                'due_today': due_today,
-                'accuracy': (stats.correct_reviews / stats.total_reviews * 100) if stats.total_reviews > 0 else 0
-            }
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def save_lesson_session(self, lesson):
+        session = self.get_session()
+        try:
+            session.merge(LessonSessionState(
+                user_id=lesson.user_id,
+                word_ids=lesson.word_ids.tobytes(),
+                current_index=lesson.current_index,
+                correct=lesson.correct,
+                start_time=lesson.start_time,
+                touched_at=lesson.touched_at,
+                token=lesson.token,
+                quiz_meta=lesson.quiz_meta,
+                quiz_options=lesson.quiz_options.tobytes()
+            ))
+            session.commit()
+        finally:
+            session.close()
+    
+    def load_lesson_session(self, user_id):
+        session = self.get_session()
+        try:
+            row = session.query(LessonSessionState).get(user_id)
+            if not row:
+                return None
             
+            word_ids = array('l')
+            word_ids.frombytes(row.word_ids)
+            quiz_options = array('i')
+            quiz_options.frombytes(row.quiz_options or b'')
+            return LessonSession(
+                user_id=row.user_id,
+                word_ids=word_ids,
+                current_index=row.current_index,
+                correct=row.correct,
+                start_time=row.start_time,
+                touched_at=row.touched_at,
+                token=row.token,
+                quiz_meta=row.quiz_meta or b'',
+                quiz_options=quiz_options
+            )
+        finally:
+            session.close()
+    
+    def delete_lesson_session(self, user_id):
+        session = self.get_session()
+        try:
+            session.query(LessonSessionState).filter_by(user_id=user_id).delete()
+            session.commit()
+        finally:
+            session.close()
+    
+    def delete_stale_lesson_sessions(self, touched_before):
+        session = self.get_session()
+        try:
+            session.query(LessonSessionState).filter(
+                LessonSessionState.touched_at < touched_before
+            ).delete()
+            session.commit()
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+    
+    def get_voice_file_id(self, cache_key):
+        file_ids = self.voice_file_ids
+        if file_ids is None:
+            # Загрузка и правки словаря под одной блокировкой: запись, сохраненная
+            # во время загрузки, не потеряется
+            with self._voice_lock:
+                if self.voice_file_ids is None:
+                    session = self.get_session()
+                    try:
+                        self.voice_file_ids = dict(session.query(VoiceFileId.cache_key, VoiceFileId.file_id))
+                    finally:
+                        session.close()
+                file_ids = self.voice_file_ids
+        return file_ids.get(cache_key)
+    
+    def save_voice_file_id(self, cache_key, file_id):
+        # Один клип могут одновременно загрузить два шарда - вставка должна
+        # быть атомарной, второй просто перепишет file_id
+        stmt = _insert(self.engine, VoiceFileId.__table__).values(
+            cache_key=cache_key, file_id=file_id, created_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[VoiceFileId.cache_key],
+            set_={'file_id': stmt.excluded.file_id}
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+        with self._voice_lock:
+            if self.voice_file_ids is not None:
+                self.voice_file_ids[cache_key] = file_id
+    
+    def delete_voice_file_id(self, cache_key):
+        session = self.get_session()
+        try:
+            session.query(VoiceFileId).filter_by(cache_key=cache_key).delete()
+            session.commit()
+        finally:
+            session.close()
+        with self._voice_lock:
+            if self.voice_file_ids is not None:
+                self.voice_file_ids.pop(cache_key, None)
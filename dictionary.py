@@ -0,0 +1,154 @@
+import csv
+import json
+import logging
+import time
+
+from sqlalchemy import bindparam, case, func, or_, select
+
+from config import Config
+from models import Word
+
+logger = logging.getLogger(__name__)
+
+WORD_FIELDS = (
+    'word', 'translation', 'transcription', 'example', 'example_translation',
+    'level', 'part_of_speech', 'topic', 'frequency'
+)
+
+DEFAULT_FREQUENCY = 100
+
+
+def executemany(conn, stmt, params):
+    # Core-выражение компилируется один раз под диалект соединения и вместе
+    # со списком dict уходит прямо в executemany драйвера: обработка
+    # параметров в SQLAlchemy на 200k строк дороже самой записи.
+    # Значения должны быть уже в виде, который принимает драйвер
+    compiled = stmt.compile(dialect=conn.dialect)
+    if compiled.positional:
+        params = [tuple(p[name] for name in compiled.positiontup) for p in params]
+    return conn.exec_driver_sql(str(compiled), params)
+
+
+def rank_words(conn):
+    # Порядок выдачи новых слов: уровень CEFR по Config.LEVEL_RANKS (неизвестные
+    # уровни - в самом конце), внутри уровня - по убыванию частоты.
+    # Переписываются только строки, у которых ранг изменился; возвращает их число
+    words = Word.__table__
+    level_rank = case(Config.LEVEL_RANKS, value=words.c.level, else_=len(Config.LEVEL_RANKS))
+    ranked = select(
+        words.c.id,
+        level_rank.label('level_rank'),
+        func.row_number().over(
+            partition_by=level_rank,
+            order_by=(words.c.frequency.desc().nullslast(), words.c.id)
+        ).label('frequency_rank')
+    ).subquery('ranked')
+    changed = conn.execute(
+        select(ranked.c.id, ranked.c.level_rank, ranked.c.frequency_rank)
+        .join(words, words.c.id == ranked.c.id)
+        .where(or_(
+            words.c.level_rank.is_distinct_from(ranked.c.level_rank),
+            words.c.frequency_rank.is_distinct_from(ranked.c.frequency_rank)
+        ))
+    ).all()
+    if changed:
+        executemany(
+            conn,
+            words.update().where(words.c.id == bindparam('word_id')).values(
+                level_rank=bindparam('new_level_rank'),
+                frequency_rank=bindparam('new_frequency_rank')
+            ),
+            [{'word_id': i, 'new_level_rank': l, 'new_frequency_rank': r} for i, l, r in changed]
+        )
+    return len(changed)
+
+
+def read_rows(path, fmt=None):
+    # Потоковое чтение CSV (с заголовком) или JSONL: файл целиком в память не грузится
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        elif fmt == 'jsonl':
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+        else:
+            raise ValueError(f"Unknown dictionary format: {fmt}")
+
+
+def normalize_row(raw):
+    # None для строк без слова, перевода или уровня
+    if not isinstance(raw, dict):
+        return None
+
+    row = {}
+    for field in WORD_FIELDS:
+        value = raw.get(field)
+        if isinstance(value, str):
+            value = value.strip() or None
+        row[field] = value
+
+    if not row['word'] or not row['translation'] or not row['level']:
+        return None
+    row['level'] = row['level'].upper()
+
+    try:
+        row['frequency'] = int(row['frequency']) if row['frequency'] is not None else DEFAULT_FREQUENCY
+    except (TypeError, ValueError):
+        return None
+    return row
+
+
+def import_dictionary(db, path, fmt=None, chunk_size=10000, progress=None):
+    # Строки пишутся пачками по chunk_size через Database.upsert_words.
+    # Повторы (word, level) внутри пачки схлопываются (побеждает последняя
+    # строка файла), между пачками их разрешает сам upsert
+    report = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0, 'skipped': 0, 'elapsed': 0.0}
+    started = time.perf_counter()
+
+    def write(chunk):
+        rows = list(chunk.values())
+        inserted, updated = db.upsert_words(rows)
+        report['inserted'] += inserted
+        report['updated'] += updated
+        report['unchanged'] += len(rows) - inserted - updated
+        report['elapsed'] = time.perf_counter() - started
+        if progress:
+            progress(report)
+
+    chunk = {}
+    try:
+        for raw in read_rows(path, fmt):
+            report['rows'] += 1
+            row = normalize_row(raw)
+            if row is None:
+                report['skipped'] += 1
+                continue
+
+            key = (row['word'], row['level'])
+            if key in chunk:
+                report['duplicates'] += 1
+            chunk[key] = row
+
+            if len(chunk) >= chunk_size:
+                write(chunk)
+                chunk = {}
+
+        if chunk:
+            write(chunk)
+    finally:
+        if report['inserted'] or report['updated']:
+            db.dictionary_changed()
+
+    report['elapsed'] = time.perf_counter() - started
+    logger.info(
+        f"Imported {path}: {report['rows']} rows, {report['inserted']} new, {report['updated']} updated, "
+        f"{report['unchanged']} unchanged, {report['duplicates']} duplicates, {report['skipped']} skipped in {report['elapsed']:.1f}s"
+    )
+    return report
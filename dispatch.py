@@ -0,0 +1,140 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+import metrics
+from sql_profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+def update_key(update):
+    # Состояние урока хранится по пользователю; в личном чате это и id чата
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return 0
+
+
+# Один поток со своим event loop. Обновления одного чата - строго по очереди
+# (asyncio.Lock отдает блокировку в порядке прихода). Вызовы Bot API и часть
+# запросов к БД в обработчиках блокирующие и держат поток шарда целиком:
+# другие чаты того же шарда продвигаются только на await, которые реально
+# отдают управление (async_db, синтез речи). Параллельность - это число шардов
+class _Shard:
+    def __init__(self, index, max_pending):
+        self.index = index
+        self.loop = asyncio.new_event_loop()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._chats = {}
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+        self.thread = threading.Thread(target=self._run, name=f'handlers-{index}', daemon=True)
+        self.thread.start()
+
+    @property
+    def depth(self):
+        return self.submitted - self.completed
+
+    def submit(self, key, coro, name, update_id=None):
+        # Блокирует вызывающий поток, пока в шарде max_pending необработанных
+        # обновлений: диспетчер перестает выбирать очередь, и она заполняется
+        self._slots.acquire()
+        with self._lock:
+            self.submitted += 1
+        return asyncio.run_coroutine_threadsafe(self._execute(key, coro, name, update_id, time.perf_counter()), self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _execute(self, key, coro, name, update_id, enqueued):
+        # Задача шарда со своим контекстом: метка для запросов к БД внутри обработчика
+        metrics.current_handler.set(name)
+        profile = profiler.begin(name, update_id)
+        # Словарь блокировок трогается только из потока этого шарда
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                started = time.perf_counter()
+                try:
+                    await coro
+                except Exception:
+                    self.failed += 1
+                    metrics.handler_errors.inc(name)
+                    logger.exception(f"Handler {name} failed for {key}")
+                finally:
+                    finished = time.perf_counter()
+                    self._record(started - enqueued, finished - started)
+                    metrics.handler_seconds.observe(finished - started, name)
+                    if profile is not None:
+                        profiler.finish(profile)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+            self.completed += 1
+            self._slots.release()
+
+    def _record(self, wait, latency):
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+
+# Исполнитель обработчиков: обновление уходит в шард по ключу пользователя,
+# так что один чат всегда обрабатывается одним потоком и по порядку.
+# Одновременно выполняется не больше workers обработчиков с блокирующими вызовами
+class ChatExecutor:
+    def __init__(self, workers=8, max_pending=1000):
+        self.shards = [_Shard(i, max_pending) for i in range(workers)]
+
+    def submit(self, key, coro, name='handler', update_id=None):
+        return self.shards[key % len(self.shards)].submit(key, coro, name, update_id)
+
+    def wrap(self, handler):
+        # Обертка для Dispatcher из python-telegram-bot 13: он вызывает
+        # обработчик синхронно, а мы только ставим корутину в нужный шард
+        @functools.wraps(handler)
+        def callback(update, context):
+            result = handler(update, context)
+            if asyncio.iscoroutine(result):
+                self.submit(update_key(update), result, handler.__name__, update.update_id)
+        return callback
+
+    def stop(self):
+        for shard in self.shards:
+            shard.stop()
+
+    def stats(self):
+        completed = sum(s.completed for s in self.shards)
+        return {
+            'workers': len(self.shards),
+            'queue_depth': sum(s.depth for s in self.shards),
+            'shard_depths': [s.depth for s in self.shards],
+            'submitted': sum(s.submitted for s in self.shards),
+            'completed': completed,
+            'failed': sum(s.failed for s in self.shards),
+            'latency_avg': sum(s.latency_total for s in self.shards) / completed if completed else 0,
+            'latency_max': max(s.latency_max for s in self.shards),
+            'wait_avg': sum(s.wait_total for s in self.shards) / completed if completed else 0,
+            'wait_max': max(s.wait_max for s in self.shards)
+        }
@@ -1,28 +1,143 @@
 import logging
-from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
-import random
+from telegram.error import BadRequest
 import asyncio
 import os
+import time
+import threading
 
 from database import Database
-from quiz import QuizGenerator
+from quiz import QuizGenerator, DistractorIndex, QUIZ_AUDIO, QUIZ_WORD
 from keyboards import Keyboards
 from voice import voice_manager
 from config import Config
+from lesson_sessions import LessonSessionStore
+from dispatch import ChatExecutor
+from async_database import AsyncDatabase
 
 logger = logging.getLogger(__name__)
 db = Database()
-quiz_gen = QuizGenerator()
+# Запросы обработчиков к базе идут через пул потоков, не блокируя event loop
+async_db = AsyncDatabase(db)
+quiz_gen = QuizGenerator(DistractorIndex(db))
 
-user_sessions = {}
+lessons = LessonSessionStore(
+    persist=db if Config.LESSON_SESSION_PERSIST else None,
+    ttl=Config.LESSON_SESSION_TTL,
+    max_bytes=Config.LESSON_SESSION_MAX_BYTES,
+    on_expire=voice_manager.cancel_prefetch
+)
+
+# Обработчики выполняются здесь, см. main.py (chat_executor.wrap)
+chat_executor = ChatExecutor(Config.HANDLER_WORKERS, Config.HANDLER_QUEUE_SIZE)
+
+# Отложенные шаги урока (показать отзыв, потом следующее слово) идут
+# через job_queue, поток обработчика никогда не спит
+pending_steps = {}
+pending_steps_lock = threading.Lock()
+
+def schedule_step(context, user_id, delay, callback):
+    job = context.job_queue.run_once(_run_step, delay, context=(user_id, callback))
+    with pending_steps_lock:
+        pending_steps.setdefault(user_id, []).append(job)
+    return job
+
+def cancel_steps(user_id):
+    with pending_steps_lock:
+        jobs = pending_steps.pop(user_id, [])
+    for job in jobs:
+        job.schedule_removal()
+
+def _run_step(context):
+    # Шаг выполняется в шарде пользователя, по очереди с его обновлениями
+    user_id, _ = context.job.context
+    chat_executor.submit(user_id, _step(context), 'lesson_step')
+
+async def _step(context):
+    user_id, callback = context.job.context
+    with pending_steps_lock:
+        # Нажатие, обработанное раньше шага, уже отменило его (cancel_steps)
+        jobs = pending_steps.get(user_id)
+        if not jobs or context.job not in jobs:
+            return
+        jobs.remove(context.job)
+        if not jobs:
+            del pending_steps[user_id]
+    
+    result = callback(context)
+    if asyncio.iscoroutine(result):
+        await result
+
+def uploaded_voice(text):
+    # (ключ, file_id) клипа, уже загруженного в Telegram в любом из форматов
+    for key in voice_manager.cache_keys(text):
+        file_id = db.get_voice_file_id(key)
+        if file_id:
+            return key, file_id
+    return None, None
+
+def voice_uploaded(text):
+    return uploaded_voice(text)[1] is not None
+
+async def send_voice_cached(context, chat_id, text, **kwargs):
+    # Клип загружается в Telegram один раз, дальше отправляем по file_id
+    key, file_id = uploaded_voice(text)
+    if file_id:
+        try:
+            return context.bot.send_voice(chat_id=chat_id, voice=file_id, **kwargs)
+        except BadRequest as e:
+            logger.warning(f"Voice file_id rejected, re-uploading: {e}")
+            db.delete_voice_file_id(key)
+    
+    audio_path = await voice_manager.text_to_speech(text)
+    if audio_path and not os.path.exists(audio_path):
+        # Файл удалили с диска в обход кэша - забываем запись и синтезируем заново
+        voice_manager.cache.discard(audio_path)
+        audio_path = await voice_manager.text_to_speech(text)
+    if not audio_path or not os.path.exists(audio_path):
+        return None
+    
+    with open(audio_path, 'rb') as audio_file:
+        message = context.bot.send_voice(chat_id=chat_id, voice=audio_file, **kwargs)
+    
+    media = message and (message.voice or message.audio or message.document)
+    if media:
+        # file_id относится к тому формату, который реально ушел (OGG или запасной MP3)
+        db.save_voice_file_id(voice_manager.cache.key_of(audio_path), media.file_id)
+    return message
+
+def prefetch_lesson_audio(user_id, words, audio_enabled):
+    texts = [w.word for w in words]
+    if audio_enabled:
+        texts += [w.example for w in words if w.example]
+    voice_manager.prefetch(user_id, [t for t in texts if not voice_uploaded(t)])
+
+def cleanup_lessons(context):
+    lessons.evict_expired()
+
+def refresh_dictionary(context):
+    quiz_gen.distractors.refresh_if_changed()
+
+class ChatTarget:
+    # Вместо редактирования сообщения отправляет новое (после голосового)
+    def __init__(self, bot, chat_id):
+        self.bot = bot
+        self.chat_id = chat_id
+    
+    def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        self.bot.send_message(
+            chat_id=self.chat_id,
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
 
 # ✅ ИСПРАВЛЕНО: убираем ContextTypes.DEFAULT_TYPE
 async def start(update: Update, context: CallbackContext):
     user = update.effective_user
     
-    db_user = db.get_or_create_user(
+    db_user = await async_db.get_or_create_user(
         telegram_id=user.id,
         username=user.username,
         first_name=user.first_name,
@@ -55,14 +170,7 @@ async def level_callback(update: Update, context: CallbackContext):
     level = query.data.replace("level_", "")
     user_id = update.effective_user.id
     
-    session = db.get_session()
-    try:
-        user = session.query(db.User).filter_by(telegram_id=user_id).first()
-        if user:
-            user.level = level
-            session.commit()
-    finally:
-        session.close()
+    db.update_user(user_id, level=level)
     
     query.edit_message_text(
         f"✅ Уровень {level} выбран!\n\n"
@@ -75,9 +183,10 @@ async def learn_today(update: Update, context: CallbackContext):
     query.answer()
     
     user_id = update.effective_user.id
-    db_user = db.get_or_create_user(user_id)
+    cancel_steps(user_id)
+    db_user = await async_db.get_or_create_user(user_id)
     
-    words = db.get_daily_words(db_user.id)
+    words = await async_db.get_daily_words(db_user.id)
     
     if not words:
         query.edit_message_text(
@@ -87,33 +196,30 @@ async def learn_today(update: Update, context: CallbackContext):
         )
         return
     
-    user_sessions[user_id] = {
-        'words': words,
-        'current_index': 0,
-        'correct': 0,
-        'total': len(words),
-        'start_time': datetime.utcnow()
-    }
+    quiz_meta, quiz_options = quiz_gen.build_plan(words, with_audio=db_user.audio_enabled)
+    lessons.start(user_id, [w.id for w in words], quiz_meta, quiz_options)
+    
+    if Config.AUDIO_PREFETCH:
+        prefetch_lesson_audio(user_id, words, db_user.audio_enabled)
     
     await send_word(query, user_id, context)
 
 async def send_word(query, user_id, context):
-    session = user_sessions.get(user_id)
+    session = lessons.get(user_id)
     if not session:
         return
     
-    idx = session['current_index']
-    words = session['words']
+    idx = session.current_index
     
-    if idx >= len(words):
+    if idx >= session.total:
         await finish_lesson(query, user_id)
         return
     
-    word = words[idx]
+    word = db.get_word(session.word_ids[idx])
     
-    db_user = db.get_or_create_user(user_id)
+    db_user = await async_db.get_or_create_user(user_id)
     
-    text = f"📚 *Слово {idx + 1} из {session['total']}*\n\n"
+    text = f"📚 *Слово {idx + 1} из {session.total}*\n\n"
     text += f"*{word.word}*"
     if word.transcription:
         text += f"  [{word.transcription}]"
@@ -129,36 +235,34 @@ async def word_callback(update: Update, context: CallbackContext):
     query = update.callback_query
     query.answer()
     
-    data = query.data.split('_')
-    action = data[0]
-    word_id = int(data[1])
+    action, word_id = query.data.rsplit('_', 1)
+    word_id = int(word_id)
     user_id = update.effective_user.id
+    cancel_steps(user_id)
     
-    if user_id not in user_sessions:
+    session = lessons.get(user_id)
+    if not session:
         query.edit_message_text("Сессия истекла. Начни заново.")
         return
     
-    session = user_sessions[user_id]
-    db_user = db.get_or_create_user(user_id)
+    db_user = await async_db.get_or_create_user(user_id)
     
-    word = next((w for w in session['words'] if w.id == word_id), None)
+    word = db.get_word(word_id) if word_id in session.word_ids else None
     if not word:
         query.edit_message_text("Ошибка: слово не найдено")
         return
     
     if action == 'audio':
-        query.edit_message_text("🔊 Генерирую аудио...")
+        if not voice_uploaded(word.word):
+            query.edit_message_text("🔊 Генерирую аудио...")
         
-        audio_path = await voice_manager.text_to_speech(word.word)
+        message = await send_voice_cached(
+            context, user_id, word.word,
+            caption=f"Слово: {word.word}",
+            reply_markup=Keyboards.learning_options(word_id, db_user.audio_enabled)
+        )
         
-        if audio_path and os.path.exists(audio_path):
-            with open(audio_path, 'rb') as audio_file:
-                context.bot.send_voice(
-                    chat_id=user_id,
-                    voice=audio_file,
-                    caption=f"Слово: {word.word}",
-                    reply_markup=Keyboards.learning_options(word_id, db_user.audio_enabled)
-                )
+        if message:
             query.delete_message()
         else:
             query.edit_message_text(
@@ -167,37 +271,33 @@ async def word_callback(update: Update, context: CallbackContext):
             )
         return
     
-    elif action == 'audiotest':
-        query.edit_message_text("🎧 Генерирую аудио-тест...")
-        
-        audio_path = await voice_manager.text_to_speech(word.word)
+    elif action == 'quiz':
+        index = session.word_ids.index(word_id)
+        planned = session.quiz(index)
+        if not planned:
+            return
         
-        other_words = [w for w in session['words'] if w.id != word.id]
-        wrong_options = [w.translation for w in other_words[:3]]
-        while len(wrong_options) < 3:
-            wrong_options.append(f"вариант_{random.randint(1, 100)}")
+        quiz = quiz_gen.plan_quiz(
+            word, *planned,
+            words_by_id={w.id: w for w in db.get_words(session.word_ids)},
+            with_audio=db_user.audio_enabled
+        )
+        keyboard = Keyboards.quiz_options(session.token, index, quiz['options'])
         
-        options = [word.translation] + wrong_options
-        random.shuffle(options)
+        if quiz['type'] != QUIZ_AUDIO:
+            query.edit_message_text(quiz['question'], reply_markup=keyboard, parse_mode='Markdown')
+            return
         
-        context.user_data['current_test'] = {
-            'word_id': word_id,
-            'correct': word.translation,
-            'options': options
-        }
+        if not voice_uploaded(word.word):
+            query.edit_message_text("🎧 Генерирую аудио-тест...")
         
-        keyboard = []
-        for i, option in enumerate(options):
-            keyboard.append([InlineKeyboardButton(option, callback_data=f"test_answer_{i}")])
+        message = await send_voice_cached(
+            context, user_id, word.word,
+            caption=quiz['question'],
+            reply_markup=keyboard
+        )
         
-        if audio_path and os.path.exists(audio_path):
-            with open(audio_path, 'rb') as audio_file:
-                context.bot.send_voice(
-                    chat_id=user_id,
-                    voice=audio_file,
-                    caption="🎧 Какое это слово?",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
+        if message:
             query.delete_message()
         else:
             query.edit_message_text(
@@ -217,24 +317,19 @@ async def word_callback(update: Update, context: CallbackContext):
             )
             
             if db_user.audio_enabled:
-                audio_path = await voice_manager.text_to_speech(word.example)
-                if audio_path and os.path.exists(audio_path):
-                    import time
-                    time.sleep(1)
-                    with open(audio_path, 'rb') as audio_file:
-                        context.bot.send_voice(
-                            chat_id=user_id,
-                            voice=audio_file,
-                            caption="🔊 Пример произношения"
-                        )
+                schedule_step(context, user_id, Config.EXAMPLE_AUDIO_DELAY,
+                              lambda job_context: send_voice_cached(
+                                  job_context, user_id, word.example,
+                                  caption="🔊 Пример произношения"
+                              ))
             
-            time.sleep(2)
-            await send_word(query, user_id, context)
+            schedule_step(context, user_id, Config.EXAMPLE_DELAY,
+                          lambda job_context: send_word(query, user_id, job_context))
         return
     
     elif action == 'know':
         correct = True
-        session['correct'] += 1
+        session.correct += 1
         feedback = "✅ Отлично! Запоминаем."
         
     elif action == 'dont_know':
@@ -248,71 +343,68 @@ async def word_callback(update: Update, context: CallbackContext):
     else:
         return
     
-    db.update_word_progress(db_user.id, word_id, correct)
+    await async_db.update_word_progress(db_user.id, word_id, correct)
     
-    session['current_index'] += 1
+    session.current_index += 1
+    lessons.save(session)
     
     query.edit_message_text(feedback, parse_mode='Markdown')
     
-    import time
-    time.sleep(1.5)
-    await send_word(query, user_id, context)
+    schedule_step(context, user_id, Config.FEEDBACK_DELAY,
+                  lambda job_context: send_word(query, user_id, job_context))
 
 async def test_answer(update: Update, context: CallbackContext):
     query = update.callback_query
     query.answer()
     
-    answer_index = int(query.data.replace("test_answer_", ""))
-    test_data = context.user_data.get('current_test', {})
+    # qa_<токен урока>_<номер слова>_<номер варианта>, см. Keyboards.quiz_options
+    _, token, index, answer_index = query.data.split('_')
+    token, index, answer_index = int(token, 16), int(index), int(answer_index)
+    user_id = update.effective_user.id
     
-    if not test_data:
+    session = lessons.get(user_id)
+    planned = session.quiz(index) if session and session.token == token else None
+    if not planned:
         query.edit_message_text("Тест устарел. Начни заново.")
         return
     
-    selected = test_data['options'][answer_index]
-    correct = test_data['correct']
-    word_id = test_data['word_id']
-    user_id = update.effective_user.id
+    cancel_steps(user_id)
+    quiz_type, correct_index, _ = planned
+    word_id = session.word_ids[index]
+    word = db.get_word(word_id)
+    correct = word.word if quiz_type == QUIZ_WORD else word.translation
     
-    is_correct = (selected == correct)
+    is_correct = (answer_index == correct_index)
     
-    db_user = db.get_or_create_user(user_id)
-    db.update_word_progress(db_user.id, word_id, is_correct)
+    db_user = await async_db.get_or_create_user(user_id)
+    await async_db.update_word_progress(db_user.id, word_id, is_correct)
     
-    if is_correct and user_id in user_sessions:
-        user_sessions[user_id]['correct'] += 1
+    if is_correct:
+        session.correct += 1
+        lessons.save(session)
         feedback = "✅ Правильно! Молодец!"
     else:
         feedback = f"❌ Неправильно. Правильный ответ: {correct}"
     
-    query.edit_message_text(feedback)
-    
-    import time
-    time.sleep(2)
-    
-    if user_id in user_sessions:
-        class FakeQuery:
-            def __init__(self, uid):
-                self.user_id = uid
-            def edit_message_text(self, text, reply_markup=None, parse_mode=None):
-                context.bot.send_message(
-                    chat_id=self.user_id,
-                    text=text,
-                    reply_markup=reply_markup,
-                    parse_mode=parse_mode
-                )
-        
-        await send_word(FakeQuery(user_id), user_id, context)
+    # У аудио-теста вопрос в подписи к голосовому
+    if query.message and query.message.voice:
+        query.edit_message_caption(feedback)
+    else:
+        query.edit_message_text(feedback)
+    
+    schedule_step(context, user_id, Config.TEST_FEEDBACK_DELAY,
+                  lambda job_context: send_word(ChatTarget(job_context.bot, user_id), user_id, job_context))
 
 async def finish_lesson(query, user_id):
-    session = user_sessions.get(user_id)
+    session = lessons.finish(user_id)
+    voice_manager.cancel_prefetch(user_id)
     if not session:
         return
     
-    correct = session['correct']
-    total = session['total']
+    correct = session.correct
+    total = session.total
     accuracy = (correct / total) * 100
-    time_spent = (datetime.utcnow() - session['start_time']).seconds // 60
+    time_spent = int(time.time() - session.start_time) // 60
     
     text = f"""
 🎉 *Урок завершен!*
@@ -330,8 +422,6 @@ async def finish_lesson(query, user_id):
     else:
         text += "💪 Тренируйся еще, и результаты улучшатся!"
     
-    del user_sessions[user_id]
-    
     query.edit_message_text(
         text,
         reply_markup=Keyboards.after_lesson(),
@@ -343,9 +433,9 @@ async def stats(update: Update, context: CallbackContext):
     query.answer()
     
     user_id = update.effective_user.id
-    db_user = db.get_or_create_user(user_id)
+    db_user = await async_db.get_or_create_user(user_id)
     
-    stats_data = db.get_user_stats(db_user.id)
+    stats_data = await async_db.get_user_stats(db_user.id)
     if not stats_data:
         query.edit_message_text("Статистика пока недоступна")
         return
@@ -353,20 +443,20 @@ async def stats(update: Update, context: CallbackContext):
     text = f"""
 📊 *Твоя статистика*
 
-🔥 *Серия:* {stats_data['user'].streak} дней
-🎯 *Точность:* {stats_data['accuracy']:.1f}%
-📚 *Всего повторений:* {stats_data['stats'].total_reviews}
-✅ *Правильных ответов:* {stats_data['stats'].correct_reviews}
-⭐️ *Выучено слов:* {stats_data['stats'].total_words_learned}
-📅 *Сегодня к повторению:* {stats_data['due_today']}
+🔥 *Серия:* {stats_data.user.streak} дней
+🎯 *Точность:* {stats_data.accuracy:.1f}%
+📚 *Всего повторений:* {stats_data.total_reviews}
+✅ *Правильных ответов:* {stats_data.correct_reviews}
+⭐️ *Выучено слов:* {stats_data.total_words_learned}
+📅 *Сегодня к повторению:* {stats_data.due_today}
 
 *Прогресс по уровням:*
 """
     
-    for level, progress in stats_data['level_progress'].items():
-        if progress['total'] > 0:
-            bar = '█' * int(progress['percent'] // 10) + '░' * (10 - int(progress['percent'] // 10))
-            text += f"{level}: {bar} {progress['learned']}/{progress['total']} ({progress['percent']:.0f}%)\n"
+    for progress in stats_data.level_progress:
+        if progress.total > 0:
+            bar = '█' * int(progress.percent // 10) + '░' * (10 - int(progress.percent // 10))
+            text += f"{progress.level}: {bar} {progress.learned}/{progress.total} ({progress.percent:.0f}%)\n"
     
     query.edit_message_text(
         text,
@@ -379,7 +469,7 @@ async def settings(update: Update, context: CallbackContext):
     query.answer()
     
     user_id = update.effective_user.id
-    db_user = db.get_or_create_user(user_id)
+    db_user = await async_db.get_or_create_user(user_id)
     
     query.edit_message_text(
         "⚙️ *Настройки*\n\n"
@@ -394,19 +484,13 @@ async def toggle_audio(update: Update, context: CallbackContext):
     
     user_id = update.effective_user.id
     
-    session = db.get_session()
-    try:
-        user = session.query(db.User).filter_by(telegram_id=user_id).first()
-        if user:
-            user.audio_enabled = not user.audio_enabled
-            session.commit()
-            status = "включены" if user.audio_enabled else "выключены"
-            query.edit_message_text(
-                f"🔊 Голосовые сообщения {status}",
-                reply_markup=Keyboards.settings_menu(user)
-            )
-    finally:
-        session.close()
+    user = db.toggle_user_flag(user_id, 'audio_enabled')
+    if user:
+        status = "включены" if user.audio_enabled else "выключены"
+        query.edit_message_text(
+            f"🔊 Голосовые сообщения {status}",
+            reply_markup=Keyboards.settings_menu(user)
+        )
 
 async def change_daily(update: Update, context: CallbackContext):
     query = update.callback_query
@@ -432,35 +516,106 @@ async def set_daily(update: Update, context: CallbackContext):
     count = int(query.data.replace("set_daily_", ""))
     user_id = update.effective_user.id
     
-    session = db.get_session()
-    try:
-        user = session.query(db.User).filter_by(telegram_id=user_id).first()
-        if user:
-            user.daily_words = count
-            session.commit()
-    finally:
-        session.close()
+    user = db.update_user(user_id, daily_words=count)
     
     query.edit_message_text(
         f"✅ Установлено {count} слов в день",
         reply_markup=Keyboards.settings_menu(user)
     )
 
+async def toggle_notifications(update: Update, context: CallbackContext):
+    query = update.callback_query
+    query.answer()
+    
+    user_id = update.effective_user.id
+    
+    user = db.toggle_user_flag(user_id, 'notification_enabled')
+    if user:
+        status = "включены" if user.notification_enabled else "выключены"
+        query.edit_message_text(
+            f"🔔 Уведомления {status}",
+            reply_markup=Keyboards.settings_menu(user)
+        )
+
+async def change_time(update: Update, context: CallbackContext):
+    query = update.callback_query
+    query.answer()
+    
+    keyboard = []
+    for time_option in Config.NOTIFICATION_TIMES:
+        keyboard.append([InlineKeyboardButton(
+            f"⏰ {time_option}",
+            callback_data=f"set_time_{time_option}"
+        )])
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="settings")])
+    
+    query.edit_message_text(
+        "Выбери время ежедневного напоминания:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def set_time(update: Update, context: CallbackContext):
+    query = update.callback_query
+    query.answer()
+    
+    notification_time = query.data.replace("set_time_", "")
+    user_id = update.effective_user.id
+    
+    user = db.update_user(user_id, notification_time=notification_time)
+    
+    query.edit_message_text(
+        f"✅ Напоминание в {notification_time}",
+        reply_markup=Keyboards.settings_menu(user)
+    )
+
+async def change_timezone(update: Update, context: CallbackContext):
+    query = update.callback_query
+    query.answer()
+    
+    # По два пояса в ряд: вариантов больше, чем времен напоминания
+    options = [
+        InlineKeyboardButton(timezone, callback_data=f"set_tz_{timezone}")
+        for timezone in Config.TIMEZONES
+    ]
+    keyboard = [options[i:i + 2] for i in range(0, len(options), 2)]
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="settings")])
+    
+    query.edit_message_text(
+        "Выбери часовой пояс - напоминание придет по местному времени:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def set_timezone(update: Update, context: CallbackContext):
+    query = update.callback_query
+    query.answer()
+    
+    timezone = query.data.replace("set_tz_", "")
+    if timezone not in Config.TIMEZONES:
+        return
+    user_id = update.effective_user.id
+    
+    user = db.update_user(user_id, timezone=timezone)
+    
+    query.edit_message_text(
+        f"✅ Часовой пояс: {timezone}, напоминание в {user.notification_time}",
+        reply_markup=Keyboards.settings_menu(user)
+    )
+
 async def achievements(update: Update, context: CallbackContext):
     query = update.callback_query
     query.answer()
     
     user_id = update.effective_user.id
-    db_user = db.get_or_create_user(user_id)
-    stats_data = db.get_user_stats(db_user.id)
+    db_user = await async_db.get_or_create_user(user_id)
+    stats_data = await async_db.get_user_stats(db_user.id)
     
     achievements_list = [
-        ("🔥 Новичок", "Выучить 10 слов", stats_data['stats'].total_words_learned >= 10, "⭐️"),
-        ("🔥 Ученик", "Выучить 100 слов", stats_data['stats'].total_words_learned >= 100, "🌟"),
-        ("🔥 Мастер", "Выучить 500 слов", stats_data['stats'].total_words_learned >= 500, "💫"),
-        ("📅 Трудоголик", "Заниматься 7 дней подряд", stats_data['user'].streak >= 7, "📆"),
-        ("📅 Легенда", "Заниматься 30 дней подряд", stats_data['user'].streak >= 30, "🏆"),
-        ("🎯 Снайпер", "Точность 90% за неделю", stats_data['accuracy'] >= 90, "🎯"),
+        ("🔥 Новичок", "Выучить 10 слов", stats_data.total_words_learned >= 10, "⭐️"),
+        ("🔥 Ученик", "Выучить 100 слов", stats_data.total_words_learned >= 100, "🌟"),
+        ("🔥 Мастер", "Выучить 500 слов", stats_data.total_words_learned >= 500, "💫"),
+        ("📅 Трудоголик", "Заниматься 7 дней подряд", stats_data.user.streak >= 7, "📆"),
+        ("📅 Легенда", "Заниматься 30 дней подряд", stats_data.user.streak >= 30, "🏆"),
+        ("🎯 Снайпер", "Точность 90% за неделю", stats_data.accuracy >= 90, "🎯"),
     ]
     
     text = "🏆 *Твои достижения*\n\n"
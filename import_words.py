@@ -0,0 +1,44 @@
+# Загрузка словаря CEFR из CSV (с заголовком) или JSONL:
+#
+#   python import_words.py words_a1_c1.csv
+#   python import_words.py updates.jsonl --chunk-size 20000
+#
+# Поля: word, translation, level обязательны; transcription, example,
+# example_translation, part_of_speech, topic, frequency - по желанию.
+# Повторный импорт обновляет изменившиеся слова по ключу (word, level),
+# прогресс пользователей не затрагивается.
+import argparse
+import logging
+import sys
+
+from database import Database
+from dictionary import import_dictionary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or update the word dictionary from CSV/JSONL")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Detected from the extension by default")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="Rows per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    def progress(report):
+        rate = report['rows'] / report['elapsed'] if report['elapsed'] else 0
+        print(f"\r{report['rows']} rows, {report['inserted']} new, {report['updated']} updated, "
+              f"{rate:,.0f} rows/s", end='', file=sys.stderr, flush=True)
+
+    db = Database()
+    report = import_dictionary(db, args.path, args.format, args.chunk_size, progress)
+    db.close()
+    print(file=sys.stderr)
+
+    rate = report['rows'] / report['elapsed'] if report['elapsed'] else 0
+    print(f"Imported {report['rows']} rows in {report['elapsed']:.1f}s ({rate:,.0f} rows/s): "
+          f"{report['inserted']} new, {report['updated']} updated, {report['unchanged']} unchanged, "
+          f"{report['duplicates']} duplicates, {report['skipped']} skipped")
+
+
+if __name__ == '__main__':
+    main()
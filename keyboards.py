@@ -42,12 +42,23 @@ class Keyboards:
         ]
         
         if audio_enabled:
-            keyboard.insert(1, [InlineKeyboardButton("🎧 Аудио-тест", callback_data=f"audiotest_{word_id}")])
+            keyboard.insert(1, [InlineKeyboardButton("🎧 Аудио-тест", callback_data=f"quiz_{word_id}")])
+        else:
+            keyboard.insert(1, [InlineKeyboardButton("🧩 Тест", callback_data=f"quiz_{word_id}")])
         
         keyboard.append([InlineKeyboardButton("⏭ Пропустить", callback_data=f"skip_{word_id}")])
         
         return InlineKeyboardMarkup(keyboard)
     
+    @staticmethod
+    def quiz_options(token, index, options):
+        # callback_data: qa_<токен урока hex>_<номер слова>_<номер варианта>
+        keyboard = [
+            [InlineKeyboardButton(text, callback_data=f"qa_{token:x}_{index}_{option}")]
+            for option, text in options
+        ]
+        return InlineKeyboardMarkup(keyboard)
+    
     @staticmethod
     def after_lesson():
         keyboard = [
@@ -68,6 +79,7 @@ class Keyboards:
             [InlineKeyboardButton(f"🔊 Аудио: {audio_status}", callback_data="toggle_audio")],
             [InlineKeyboardButton(f"🔔 Уведомления: {notif_status}", callback_data="toggle_notifications")],
             [InlineKeyboardButton(f"⏰ Время: {user.notification_time}", callback_data="change_time")],
+            [InlineKeyboardButton(f"🌍 Часовой пояс: {user.timezone}", callback_data="change_timezone")],
             [InlineKeyboardButton("◀️ Назад", callback_data="main_menu")]
         ]
         return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
@@ -0,0 +1,177 @@
+import random
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from quiz import QUIZ_OPTIONS
+
+# Узел OrderedDict и ключ - примерно столько сверх самой сессии
+ENTRY_OVERHEAD = 160
+
+
+class LessonSession:
+    __slots__ = ('user_id', 'word_ids', 'current_index', 'correct', 'start_time', 'touched_at',
+                 'token', 'quiz_meta', 'quiz_options')
+
+    def __init__(self, user_id, word_ids, current_index=0, correct=0, start_time=None, touched_at=None,
+                 token=None, quiz_meta=b'', quiz_options=None):
+        self.user_id = user_id
+        self.word_ids = word_ids if isinstance(word_ids, array) else array('l', word_ids)
+        self.current_index = current_index
+        self.correct = correct
+        self.start_time = start_time or time.time()
+        self.touched_at = touched_at or self.start_time
+        # Короткий токен урока в callback_data ответов: кнопки старого урока не сработают
+        self.token = token or random.getrandbits(31) or 1
+        self.quiz_meta = quiz_meta
+        self.quiz_options = quiz_options if isinstance(quiz_options, array) else array('i', quiz_options or [])
+
+    @property
+    def total(self):
+        return len(self.word_ids)
+
+    @property
+    def current_word_id(self):
+        if self.current_index < len(self.word_ids):
+            return self.word_ids[self.current_index]
+        return None
+
+    def quiz(self, index):
+        # (тип, индекс правильного варианта, id вариантов) или None, если плана нет
+        if index >= len(self.quiz_meta):
+            return None
+        meta = self.quiz_meta[index]
+        start = index * QUIZ_OPTIONS
+        return meta >> 2, meta & 3, self.quiz_options[start:start + QUIZ_OPTIONS]
+
+    def nbytes(self):
+        return (sys.getsizeof(self) + sys.getsizeof(self.word_ids)
+                + sys.getsizeof(self.quiz_meta) + sys.getsizeof(self.quiz_options))
+
+
+# Хранилище незавершенных уроков: только id слов и счетчики,
+# вытеснение по TTL и по общему объему памяти.
+# С persist (Database) уроки дублируются в таблицу lesson_sessions
+# и переживают перезапуск бота.
+class LessonSessionStore:
+    def __init__(self, persist=None, ttl=6 * 3600, max_bytes=64 * 1024 * 1024, on_expire=None):
+        self.persist = persist
+        self.on_expire = on_expire
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.expired = 0
+        self.evicted = 0
+        self.restored = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def start(self, user_id, word_ids, quiz_meta=b'', quiz_options=None):
+        session = LessonSession(user_id, word_ids, quiz_meta=quiz_meta, quiz_options=quiz_options)
+        with self._lock:
+            self._remove(user_id)
+            self._insert(session)
+            self._evict()
+        if self.persist:
+            self.persist.save_lesson_session(session)
+        return session
+
+    def get(self, user_id):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                if now - session.touched_at > self.ttl:
+                    self._remove(user_id)
+                    self.expired += 1
+                    self._expired(user_id)
+                    session = None
+                else:
+                    session.touched_at = now
+                    self._sessions.move_to_end(user_id)
+                    return session
+
+        if not self.persist:
+            return None
+
+        session = self.persist.load_lesson_session(user_id)
+        if session is None:
+            return None
+        if now - session.touched_at > self.ttl:
+            self.persist.delete_lesson_session(user_id)
+            self.expired += 1
+            return None
+
+        session.touched_at = now
+        with self._lock:
+            self._remove(user_id)
+            self._insert(session)
+            self._evict()
+        self.restored += 1
+        return session
+
+    def save(self, session):
+        session.touched_at = time.time()
+        if self.persist:
+            self.persist.save_lesson_session(session)
+
+    def finish(self, user_id):
+        with self._lock:
+            session = self._remove(user_id)
+        if self.persist:
+            self.persist.delete_lesson_session(user_id)
+        return session
+
+    def evict_expired(self):
+        with self._lock:
+            self._evict()
+        if self.persist:
+            self.persist.delete_stale_lesson_sessions(time.time() - self.ttl)
+
+    def stats(self):
+        return {
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'restored': self.restored
+        }
+
+    def _insert(self, session):
+        self._sessions[session.user_id] = session
+        self._bytes += session.nbytes() + ENTRY_OVERHEAD
+
+    def _remove(self, user_id):
+        session = self._sessions.pop(user_id, None)
+        if session is not None:
+            self._bytes -= session.nbytes() + ENTRY_OVERHEAD
+        return session
+
+    def _expired(self, user_id):
+        if self.on_expire:
+            self.on_expire(user_id)
+
+    def _evict(self):
+        # Самые давние сессии всегда в начале OrderedDict
+        deadline = time.time() - self.ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.touched_at < deadline:
+                self.expired += 1
+                self._expired(user_id)
+            elif self._bytes > self.max_bytes:
+                # Из памяти уходит, но в таблице остается
+                self.evicted += 1
+            else:
+                break
+            self._remove(user_id)
@@ -1,11 +1,23 @@
+import hmac
 import logging
 import os
+import queue
+import signal
+import sys
+from telegram import Bot
 from telegram.ext import Updater, CommandHandler, CallbackQueryHandler
-from flask import Flask
+from telegram.error import TelegramError
+from flask import Flask, Response, request, jsonify
 import threading
 
 from config import Config
 from handlers import *
+from notifications import send_notifications
+from scheduler import NotificationScheduler
+from webhook import WebhookReceiver, SECRET_HEADER, default_secret
+import metrics
+from metrics import MeteredRequest, Sampled
+from sql_profiler import profiler
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -15,38 +27,164 @@ logging.basicConfig(
 # Создаем простое Flask приложение для health check
 app = Flask(__name__)
 
+# В режиме webhook обновления приходят на тот же сервер, что и /health
+webhook = None
+
 @app.route('/')
 @app.route('/health')
 def health():
     return "Bot is running!"
 
+@app.route(Config.WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    if webhook is None:
+        return "Webhook is disabled", 404
+    status, text = webhook.handle(request.headers.get(SECRET_HEADER), request.get_data())
+    return text, status
+
+@app.route('/stats')
+def stats_endpoint():
+    return jsonify({
+        'handlers': chat_executor.stats(),
+        'database': async_db.stats(),
+        'webhook': webhook.stats() if webhook else None
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/debug/sql-profile', methods=['GET', 'POST'])
+def sql_profile_endpoint():
+    # POST ?enabled=1&slow_ms=100&repeat=5 - переключение без перезапуска
+    token = request.headers.get('X-Admin-Token')
+    if not Config.ADMIN_TOKEN or not token or not hmac.compare_digest(token, Config.ADMIN_TOKEN):
+        return "Forbidden", 403
+    if request.method == 'POST':
+        enabled = request.args.get('enabled')
+        profiler.configure(
+            enabled=enabled == '1' if enabled is not None else None,
+            slow_ms=request.args.get('slow_ms', type=float),
+            repeat_threshold=request.args.get('repeat', type=int)
+        )
+    return jsonify(profiler.stats())
+
+def register_metrics(update_queue):
+    # Значения, которые уже считают сами модули, читаются при запросе /metrics
+    Sampled('wordich_update_queue_depth', 'Updates waiting for the dispatcher', update_queue.qsize)
+    Sampled('wordich_handler_queue_depth', 'Updates submitted to a handler thread and not finished yet',
+            lambda: {str(shard.index): shard.depth for shard in chat_executor.shards}, labels='shard')
+    Sampled('wordich_db_pool_pending', 'Handler queries queued or running in the DB pool', lambda: async_db.pending)
+    Sampled('wordich_lesson_sessions', 'Lesson sessions held in memory', lambda: len(lessons))
+    Sampled('wordich_tts_queue_depth', 'Clips waiting for synthesis', voice_manager.engine.queue_depth)
+    Sampled('wordich_voice_cache_lookups_total', 'Voice cache lookups by result',
+            lambda: {'hit': voice_manager.cache.hits, 'miss': voice_manager.cache.misses},
+            kind='counter', labels='result')
+    Sampled('wordich_voice_cache_hit_ratio', 'Share of voice cache lookups served from disk',
+            lambda: voice_manager.cache.stats()['hit_ratio'])
+    Sampled('wordich_webhook_requests_total', 'Webhook requests by result',
+            lambda: {name: count for name, count in webhook.stats().items()
+                     if name in ('received', 'rejected', 'invalid', 'throttled')} if webhook else {},
+            kind='counter', labels='result')
+
 def run_flask():
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port)
 
+def start_webhook(updater):
+    # False - не вышло, остаемся на polling
+    global webhook
+    secret = Config.WEBHOOK_SECRET or default_secret(Config.BOT_TOKEN)
+    url = Config.WEBHOOK_URL.rstrip('/') + Config.WEBHOOK_PATH
+    try:
+        updater.bot.set_webhook(
+            url=url,
+            secret_token=secret,
+            max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+        )
+    except TelegramError as e:
+        logging.warning(f"Could not set webhook {url}: {e}, falling back to polling")
+        return False
+    
+    webhook = WebhookReceiver(updater.bot, updater.dispatcher.update_queue, secret)
+    logging.info(f"Webhook set to {url}")
+    return True
+
+def create_updater(base_url=None):
+    # Updater со всеми обработчиками и фоновыми задачами, но не запущенный.
+    # base_url - другой адрес Bot API (нагрузочный тест, benchmarks/bench_load.py)
+    # ✅ Правильный способ создания Updater
+    # Запросы к Bot API идут из всех потоков-обработчиков сразу,
+    # MeteredRequest пишет их время и ошибки в /metrics
+    request_pool = MeteredRequest(con_pool_size=Config.HANDLER_WORKERS + 8)
+    updater = Updater(
+        bot=Bot(Config.BOT_TOKEN, base_url=base_url, request=request_pool),
+        use_context=True
+    )
+    dp = updater.dispatcher
+    
+    # Ограниченная очередь обновлений: при перегрузке webhook отвечает 503,
+    # а polling просто ждет, пока освободится место
+    update_queue = queue.Queue(maxsize=Config.UPDATE_QUEUE_SIZE)
+    updater.update_queue = dp.update_queue = update_queue
+    register_metrics(update_queue)
+
+    # Добавляем все обработчики команд. Диспетчер только раскладывает
+    # обновления по потокам chat_executor, сами обработчики идут там
+    dp.add_handler(CommandHandler("start", chat_executor.wrap(start)))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(level_callback), pattern="^level_"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(learn_today), pattern="^learn_today$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(stats), pattern="^stats$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(settings), pattern="^settings$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(achievements), pattern="^achievements$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(main_menu), pattern="^main_menu$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(change_daily), pattern="^change_daily$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(set_daily), pattern="^set_daily_"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(toggle_audio), pattern="^toggle_audio$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(toggle_notifications), pattern="^toggle_notifications$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(change_time), pattern="^change_time$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(set_time), pattern="^set_time_"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(change_timezone), pattern="^change_timezone$"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(set_timezone), pattern="^set_tz_"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(word_callback), pattern="^(know_|dont_know_|example_|skip_|audio_|quiz_)"))
+    dp.add_handler(CallbackQueryHandler(chat_executor.wrap(test_answer), pattern="^qa_"))
+    
+    updater.job_queue.run_repeating(cleanup_lessons, interval=600, first=600)
+    updater.job_queue.run_repeating(refresh_dictionary, interval=60, first=60)
+    return updater
+
 def main():
+    updater = create_updater()
+    dp = updater.dispatcher
+    
+    # Ежедневные напоминания - планировщик внутри процесса
+    scheduler = NotificationScheduler(
+        db,
+        lambda notification_time, timezone: send_notifications(updater.bot, db, notification_time, timezone)
+    )
+    scheduler.start()
+
+    if Config.WEBHOOK_URL and Config.BOT_MODE != 'polling' and start_webhook(updater):
+        logging.info("Bot starting in webhook mode...")
+        threading.Thread(target=dp.start, name='dispatcher', daemon=True).start()
+        updater.job_queue.start()
+        
+        # SIGTERM от платформы - штатная остановка, чтобы отработали atexit-обработчики
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            run_flask()
+        finally:
+            scheduler.stop()
+            updater.job_queue.stop()
+            dp.stop()
+            chat_executor.stop()
+            async_db.stop()
+        return
+    
     # Запускаем Flask в отдельном потоке
     flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
     logging.info(f"Flask server started on port {os.environ.get('PORT', 8080)}")
-    
-    # ✅ Правильный способ создания Updater
-    updater = Updater(token=Config.BOT_TOKEN, use_context=False)
-    dp = updater.dispatcher
-
-    # Добавляем все обработчики команд
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(CallbackQueryHandler(level_callback, pattern="^level_"))
-    dp.add_handler(CallbackQueryHandler(learn_today, pattern="^learn_today$"))
-    dp.add_handler(CallbackQueryHandler(stats, pattern="^stats$"))
-    dp.add_handler(CallbackQueryHandler(settings, pattern="^settings$"))
-    dp.add_handler(CallbackQueryHandler(achievements, pattern="^achievements$"))
-    dp.add_handler(CallbackQueryHandler(main_menu, pattern="^main_menu$"))
-    dp.add_handler(CallbackQueryHandler(change_daily, pattern="^change_daily$"))
-    dp.add_handler(CallbackQueryHandler(set_daily, pattern="^set_daily_"))
-    dp.add_handler(CallbackQueryHandler(toggle_audio, pattern="^toggle_audio$"))
-    dp.add_handler(CallbackQueryHandler(word_callback, pattern="^(know_|dont_know_|example_|skip_|audio_|audiotest_)"))
-    dp.add_handler(CallbackQueryHandler(test_answer, pattern="^test_answer_"))
 
     logging.info("Bot starting in polling mode...")
     updater.start_polling()
@@ -0,0 +1,195 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+from telegram.error import TelegramError
+from telegram.utils.request import Request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Обработчик, в котором сейчас идет работа: метка для запросов к БД.
+# Ставится в задаче шарда (dispatch.py), в пул БД передается вместе с контекстом
+current_handler = contextvars.ContextVar('current_handler', default='background')
+
+_registry = []
+
+
+# Метрика с записью без блокировок: каждый поток пишет в свой словарь
+# {значение метки: счетчики}, /metrics суммирует словари всех потоков.
+# Счетчики для нового значения метки создаются один раз на поток,
+# дальше запись - только инкременты. Словари завершившихся потоков
+# при чтении сливаются в один, чтобы пулы с короткоживущими потоками
+# не копили их бесконечно
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = (labels,) if isinstance(labels, str) else tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _values(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+        return values
+
+    def collect(self):
+        with self._lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self._merge(self._retired, values)
+            self._shards = alive
+
+            merged = {}
+            self._merge(merged, self._retired)
+            for thread, values in alive:
+                self._merge(merged, values)
+        return merged
+
+    def _label_text(self, key, extra=''):
+        if not self.labels:
+            return f'{{{extra}}}' if extra else ''
+        key = (key,) if len(self.labels) == 1 else key
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, key='', amount=1):
+        values = self._values()
+        values[key] = values.get(key, 0) + amount
+
+    @staticmethod
+    def _merge(target, values):
+        for key, value in list(values.items()):
+            target[key] = target.get(key, 0) + value
+
+    def render(self):
+        return [f'{self.name}{self._label_text(key)} {value}' for key, value in sorted(self.collect().items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, key=''):
+        values = self._values()
+        counts = values.get(key)
+        if counts is None:
+            # Счетчики бакетов, +Inf и сумма наблюдений
+            counts = values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @staticmethod
+    def _merge(target, values):
+        for key, counts in list(values.items()):
+            merged = target.get(key)
+            if merged is None:
+                target[key] = list(counts)
+            else:
+                for i, count in enumerate(list(counts)):
+                    merged[i] += count
+
+    def render(self):
+        lines = []
+        for key, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{self._label_text(key, le)} {cumulative}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {counts[-1]}')
+        return lines
+
+
+# Значение, которое уже хранит другой модуль (длина очереди, счетчики кэша):
+# fn вызывается при чтении /metrics и возвращает число или {метка: число}
+class Sampled(_Metric):
+    def __init__(self, name, help, fn, kind='gauge', labels=()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            return [f'{self.name} {value}']
+        return [f'{self.name}{self._label_text(key)} {v}' for key, v in sorted(value.items())]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    lines = []
+    for metric in list(_registry):
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+handler_seconds = Histogram('wordich_handler_duration_seconds', 'Handler run time per update', 'handler')
+handler_errors = Counter('wordich_handler_errors_total', 'Handlers that raised an exception', 'handler')
+db_query_seconds = Histogram('wordich_db_query_duration_seconds', 'SQL statement time by calling handler', 'handler')
+tts_seconds = Histogram('wordich_tts_synthesis_duration_seconds', 'Speech synthesis time per clip', 'status')
+telegram_seconds = Histogram('wordich_telegram_api_duration_seconds', 'Bot API call time', 'method')
+telegram_errors = Counter('wordich_telegram_api_errors_total', 'Failed Bot API calls', ('method', 'error'))
+
+
+def instrument_engine(engine):
+    # Время каждого SQL-запроса с меткой текущего обработчика
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        db_query_seconds.observe(time.perf_counter() - started, current_handler.get())
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        # after_cursor_execute для упавшего запроса не вызывается
+        started = context.connection.info.get('query_started') if context.connection else None
+        if started:
+            started.pop()
+
+
+# Request для Bot: время и ошибки каждого вызова Bot API по имени метода
+class MeteredRequest(Request):
+    def post(self, url, data, timeout=None):
+        method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            return super().post(url, data, timeout)
+        except TelegramError as e:
+            telegram_errors.inc((method, type(e).__name__))
+            raise
+        finally:
+            telegram_seconds.observe(time.perf_counter() - started, method)
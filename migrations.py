@@ -0,0 +1,147 @@
+import logging
+
+from config import Config
+from dictionary import rank_words
+
+logger = logging.getLogger(__name__)
+
+# Версия схемы хранится в PRAGMA user_version файла wordich.db
+
+
+def _add_progress_indexes(conn):
+    # Перед уникальным индексом убираем дубли (user_id, word_id),
+    # оставляя самую "прокачанную" запись
+    deleted = conn.exec_driver_sql('''
+        DELETE FROM user_word_progress WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, word_id
+                    ORDER BY review_count DESC, stage DESC, id
+                ) AS rn
+                FROM user_word_progress
+            ) WHERE rn = 1
+        )
+    ''').rowcount
+    if deleted:
+        logger.info(f"Removed {deleted} duplicate progress rows")
+
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_user_word_progress_user_next_review '
+        'ON user_word_progress (user_id, next_review)'
+    )
+    conn.exec_driver_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_user_word_progress_user_word '
+        'ON user_word_progress (user_id, word_id)'
+    )
+
+
+def _add_notification_index(conn):
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_users_notification '
+        'ON users (notification_enabled, notification_time)'
+    )
+
+
+def _add_user_timezone(conn):
+    columns = [row[1] for row in conn.exec_driver_sql('PRAGMA table_info(users)')]
+    if 'timezone' not in columns:
+        conn.exec_driver_sql("ALTER TABLE users ADD COLUMN timezone VARCHAR DEFAULT 'UTC'")
+
+
+def _add_level_learned(conn):
+    columns = [row[1] for row in conn.exec_driver_sql('PRAGMA table_info(user_stats)')]
+    if 'level_learned' not in columns:
+        conn.exec_driver_sql('ALTER TABLE user_stats ADD COLUMN level_learned JSON')
+
+    # Начальные значения счетчиков из текущего прогресса; порог тот же,
+    # что в Database._apply_review
+    conn.exec_driver_sql('''
+        UPDATE user_stats SET level_learned = (
+            SELECT json_group_object(level, learned) FROM (
+                SELECT w.level AS level, COUNT(*) AS learned
+                FROM user_word_progress p JOIN words w ON w.id = p.word_id
+                WHERE p.user_id = user_stats.user_id AND p.stage >= ?
+                GROUP BY w.level
+            )
+        )
+    ''', (Config.LEARNED_STAGE,))
+
+
+def _add_word_level_unique(conn):
+    # Дубли (word, level) сливаются в запись с меньшим id; прогресс
+    # переносится на нее, если у пользователя там еще нет своего
+    conn.exec_driver_sql('''
+        CREATE TEMP TABLE word_dups AS
+        SELECT w.id AS dup_id, k.keep_id AS keep_id
+        FROM words w JOIN (
+            SELECT word, level, MIN(id) AS keep_id FROM words
+            WHERE level IS NOT NULL
+            GROUP BY word, level HAVING COUNT(*) > 1
+        ) k ON w.word = k.word AND w.level = k.level
+        WHERE w.id <> k.keep_id
+    ''')
+    merged = conn.exec_driver_sql('SELECT COUNT(*) FROM word_dups').scalar()
+    if merged:
+        conn.exec_driver_sql('''
+            UPDATE OR IGNORE user_word_progress
+            SET word_id = (SELECT keep_id FROM word_dups WHERE dup_id = word_id)
+            WHERE word_id IN (SELECT dup_id FROM word_dups)
+        ''')
+        conn.exec_driver_sql('DELETE FROM user_word_progress WHERE word_id IN (SELECT dup_id FROM word_dups)')
+        conn.exec_driver_sql('DELETE FROM words WHERE id IN (SELECT dup_id FROM word_dups)')
+        logger.warning(f"Merged {merged} duplicate words, run rebuild_stats.py to fix counters")
+    conn.exec_driver_sql('DROP TABLE word_dups')
+
+    conn.exec_driver_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_words_word_level '
+        'ON words (word, level)'
+    )
+
+
+def _add_word_frontier(conn):
+    for table, column in [('words', 'level_rank'), ('words', 'frequency_rank'),
+                          ('users', 'frontier_level'), ('users', 'frontier_rank')]:
+        columns = [row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column} INTEGER')
+    conn.exec_driver_sql('UPDATE users SET frontier_level = 0, frontier_rank = 0 WHERE frontier_level IS NULL')
+
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_words_frontier '
+        'ON words (level_rank, frequency_rank)'
+    )
+    rank_words(conn)
+
+
+def _add_lesson_quiz_plan(conn):
+    columns = [row[1] for row in conn.exec_driver_sql('PRAGMA table_info(lesson_sessions)')]
+    for column, column_type in [('token', 'INTEGER'), ('quiz_meta', 'BLOB'), ('quiz_options', 'BLOB')]:
+        if column not in columns:
+            conn.exec_driver_sql(f'ALTER TABLE lesson_sessions ADD COLUMN {column} {column_type}')
+
+
+MIGRATIONS = [
+    (1, _add_progress_indexes),
+    (2, _add_notification_index),
+    (3, _add_user_timezone),
+    (4, _add_level_learned),
+    (5, _add_word_level_unique),
+    (6, _add_word_frontier),
+    (7, _add_lesson_quiz_plan),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def upgrade(engine):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    with engine.begin() as conn:
+        version = conn.exec_driver_sql('PRAGMA user_version').scalar()
+        for target, step in MIGRATIONS:
+            if version < target:
+                logger.info(f"Upgrading schema to version {target}: {step.__name__}")
+                step(conn)
+                version = target
+        conn.exec_driver_sql(f'PRAGMA user_version = {version}')
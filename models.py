@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, JSON, Index, Float, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -20,12 +20,20 @@ class User(Base):
     last_active = Column(DateTime, default=datetime.utcnow)
     notification_time = Column(String, default='09:00')
     notification_enabled = Column(Boolean, default=True)
+    timezone = Column(String, default='UTC')
     audio_enabled = Column(Boolean, default=True)
+    # Курсор по порядку новых слов (Word.level_rank, Word.frequency_rank)
+    frontier_level = Column(Integer, default=0)
+    frontier_rank = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     settings = Column(JSON, default={})
     
     progress = relationship("UserWordProgress", back_populates="user", cascade="all, delete-orphan")
     stats = relationship("UserStats", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index('ix_users_notification', 'notification_enabled', 'notification_time'),
+    )
 
 class Word(Base):
     __tablename__ = 'words'
@@ -40,9 +48,17 @@ class Word(Base):
     part_of_speech = Column(String)
     topic = Column(String)
     frequency = Column(Integer, default=100)
+    # Порядок выдачи новых слов, пересчитывается dictionary.rank_words
+    level_rank = Column(Integer)
+    frequency_rank = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     progress = relationship("UserWordProgress", back_populates="word", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index('ux_words_word_level', 'word', 'level', unique=True),
+        Index('ix_words_frontier', 'level_rank', 'frequency_rank'),
+    )
 
 class UserWordProgress(Base):
     __tablename__ = 'user_word_progress'
@@ -61,6 +77,11 @@ class UserWordProgress(Base):
     
     user = relationship("User", back_populates="progress")
     word = relationship("Word", back_populates="progress")
+    
+    __table_args__ = (
+        Index('ix_user_word_progress_user_next_review', 'user_id', 'next_review'),
+        Index('ux_user_word_progress_user_word', 'user_id', 'word_id', unique=True),
+    )
 
 class UserStats(Base):
     __tablename__ = 'user_stats'
@@ -70,10 +91,38 @@ class UserStats(Base):
     total_reviews = Column(Integer, default=0)
     correct_reviews = Column(Integer, default=0)
     total_words_learned = Column(Integer, default=0)
+    # Выученные слова (stage >= Config.LEARNED_STAGE) по уровням: {'A1': 12, ...}
+    level_learned = Column(JSON, default=dict)
     current_streak = Column(Integer, default=0)
     longest_streak = Column(Integer, default=0)
     total_time_spent = Column(Integer, default=0)
     last_week_activity = Column(JSON, default=lambda: [0] * 7)
     achievements = Column(JSON, default=list)
     
-    user = relationship("User", back_populates="stats")
\ No newline at end of file
+    user = relationship("User", back_populates="stats")
+
+class LessonSessionState(Base):
+    __tablename__ = 'lesson_sessions'
+    
+    user_id = Column(Integer, primary_key=True)
+    word_ids = Column(LargeBinary, nullable=False)
+    current_index = Column(Integer, default=0)
+    correct = Column(Integer, default=0)
+    start_time = Column(Float)
+    touched_at = Column(Float, index=True)
+    token = Column(Integer)
+    quiz_meta = Column(LargeBinary)
+    quiz_options = Column(LargeBinary)
+
+class VoiceFileId(Base):
+    __tablename__ = 'voice_file_ids'
+    
+    cache_key = Column(String, primary_key=True)
+    file_id = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SchedulerState(Base):
+    __tablename__ = 'scheduler_state'
+    
+    name = Column(String, primary_key=True)
+    last_run = Column(DateTime)
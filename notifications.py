@@ -1,52 +1,89 @@
-import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from celery import Celery
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter, TelegramError
 from config import Config
 
-celery_app = Celery(
-    'wordich',
-    broker=Config.REDIS_URL,
-    backend=Config.REDIS_URL
-)
-
-@celery_app.task
-def send_daily_notifications():
-    asyncio.run(_send_notifications())
-
-async def _send_notifications():
-    from database import Database
-    from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
-    
-    db = Database()
-    bot = Bot(token=Config.BOT_TOKEN)
-    
-    session = db.get_session()
-    try:
-        users = session.query(User).filter_by(notification_enabled=True).all()
-        
-        current_time = datetime.utcnow().strftime('%H:%M')
-        
-        for user in users:
-            if user.notification_time == current_time:
-                try:
-                    due_words = session.query(UserWordProgress).filter(
-                        UserWordProgress.user_id == user.id,
-                        UserWordProgress.next_review <= datetime.utcnow()
-                    ).count()
-                    
-                    if due_words > 0:
-                        text = f"🔔 *Время учить слова!*\n\n"
-                        text += f"У тебя {due_words} слов для повторения сегодня."
-                        
-                        keyboard = [[InlineKeyboardButton("📚 Начать урок", callback_data="learn_today")]]
-                        
-                        await bot.send_message(
-                            chat_id=user.telegram_id,
-                            text=text,
-                            parse_mode='Markdown',
-                            reply_markup=InlineKeyboardMarkup(keyboard)
-                        )
-                except Exception as e:
-                    print(f"Error sending notification: {e}")
-    finally:
-        session.close()
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и 1 в секунду в один чат
+class RateLimiter:
+    def __init__(self, rate=30, per_chat_interval=1.0):
+        self.interval = 1.0 / rate
+        self.per_chat_interval = per_chat_interval
+        self._next_slot = 0.0
+        self._chat_slots = {}
+        self._lock = threading.Lock()
+
+    def wait(self, chat_id):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._chat_slots.get(chat_id, 0.0))
+            self._next_slot = slot + self.interval
+            self._chat_slots[chat_id] = slot + self.per_chat_interval
+            if len(self._chat_slots) > 10000:
+                self._chat_slots = {c: t for c, t in self._chat_slots.items() if t > now}
+
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        # RetryAfter от Telegram: сдвигаем все следующие отправки
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+rate_limiter = RateLimiter(rate=Config.NOTIFICATION_RATE)
+
+def _send_one(bot, telegram_id, due_words):
+    text = f"🔔 *Время учить слова!*\n\n"
+    text += f"У тебя {due_words} слов для повторения сегодня."
+
+    keyboard = [[InlineKeyboardButton("📚 Начать урок", callback_data="learn_today")]]
+
+    for attempt in range(2):
+        rate_limiter.wait(telegram_id)
+        try:
+            bot.send_message(
+                chat_id=telegram_id,
+                text=text,
+                parse_mode='Markdown',
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+            return True
+        except RetryAfter as e:
+            rate_limiter.pause(e.retry_after)
+        except TelegramError as e:
+            logger.warning(f"Error sending notification to {telegram_id}: {e}")
+            return False
+    return False
+
+def send_notifications(bot, db, notification_time=None, timezone='UTC'):
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    notification_time = notification_time or now.strftime('%H:%M')
+
+    targets = db.get_notification_targets(notification_time, timezone, now)
+    due = [(telegram_id, count) for telegram_id, count in targets if count > 0]
+
+    sent = 0
+    with ThreadPoolExecutor(max_workers=Config.NOTIFICATION_WORKERS) as pool:
+        for ok in pool.map(lambda target: _send_one(bot, *target), due):
+            sent += ok
+
+    report = {
+        'time': notification_time,
+        'timezone': timezone,
+        'sent': sent,
+        'skipped': len(targets) - len(due),
+        'failed': len(due) - sent,
+        'elapsed': time.perf_counter() - started
+    }
+    logger.info(
+        f"Notifications {report['time']} {report['timezone']}: sent {report['sent']}, skipped {report['skipped']}, "
+        f"failed {report['failed']} in {report['elapsed']:.2f}s"
+    )
+    return report
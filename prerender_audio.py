@@ -0,0 +1,159 @@
+# Предварительная озвучка всего словаря, запускать при деплое:
+#
+#   python prerender_audio.py --level A1 --level A2 --workers 8
+#
+# Уже озвученные клипы пропускаются, так что прерванный запуск можно повторить.
+import argparse
+import logging
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audio_cache import AudioCache
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _temp_path(cache_dir, suffix):
+    fd, path = tempfile.mkstemp(prefix=AudioCache.TMP_PREFIX, suffix=suffix, dir=cache_dir)
+    os.close(fd)
+    return path
+
+
+def _transcode(pairs, bitrate):
+    # Один процесс ffmpeg на всю пачку: -i a -i b ... -map 0:a out0 -map 1:a out1
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error']
+    for mp3_path, _ in pairs:
+        cmd += ['-i', mp3_path]
+    for i, (_, ogg_path) in enumerate(pairs):
+        cmd += ['-map', f'{i}:a', '-c:a', 'libopus', '-b:a', bitrate, ogg_path]
+    subprocess.run(cmd, capture_output=True, check=True, timeout=60 + 5 * len(pairs))
+
+
+def render_batch(cache_dir, texts, lang, transcode, bitrate):
+    from gtts import gTTS
+
+    rendered = []
+    for text in texts:
+        mp3_path = _temp_path(cache_dir, '.mp3')
+        try:
+            gTTS(text=text, lang=lang, timeout=Config.TTS_TIMEOUT).save(mp3_path)
+            rendered.append((text, mp3_path))
+        except Exception as e:
+            os.unlink(mp3_path)
+            logger.error(f"TTS error for {text!r}: {e}")
+
+    if not transcode or not rendered:
+        return [(text, mp3_path, '.mp3') for text, mp3_path in rendered]
+
+    pairs = [(mp3_path, _temp_path(cache_dir, '.ogg')) for _, mp3_path in rendered]
+    try:
+        _transcode(pairs, bitrate)
+        results = [(text, ogg_path, '.ogg') for (text, _), (_, ogg_path) in zip(rendered, pairs)]
+        for mp3_path, _ in pairs:
+            os.unlink(mp3_path)
+        return results
+    except Exception as e:
+        logger.warning(f"Batch transcode failed ({e}), keeping MP3")
+        for _, ogg_path in pairs:
+            os.unlink(ogg_path)
+        return [(text, mp3_path, '.mp3') for text, mp3_path in rendered]
+
+
+def collect_texts(db, levels, topics, with_examples):
+    from models import Word
+
+    session = db.get_session()
+    try:
+        query = session.query(Word.word, Word.example)
+        if levels:
+            query = query.filter(Word.level.in_(levels))
+        if topics:
+            query = query.filter(Word.topic.in_(topics))
+
+        texts = []
+        for word, example in query.yield_per(1000):
+            texts.append(word)
+            if with_examples and example:
+                texts.append(example)
+        return list(dict.fromkeys(texts))
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render word and example audio into the voice cache")
+    parser.add_argument('--level', action='append', help="CEFR level, can be repeated")
+    parser.add_argument('--topic', action='append', help="Word topic, can be repeated")
+    parser.add_argument('--no-examples', action='store_true', help="Only render words")
+    parser.add_argument('--lang', default='en')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    # Не на уровне модуля: процессы пула импортируют этот модуль заново,
+    # и им не нужны ни БД, ни потоки синтеза VoiceManager
+    from database import Database
+    from voice import voice_manager
+
+    db = Database()
+    cache = voice_manager.cache
+    texts = collect_texts(db, args.level, args.topic, not args.no_examples)
+    db.close()
+
+    todo = [t for t in texts if not voice_manager.cached_path(t, args.lang, count=False)]
+    logger.info(f"{len(texts)} clips in selection, {len(texts) - len(todo)} already rendered, {len(todo)} to go")
+
+    batches = [todo[i:i + args.batch_size] for i in range(0, len(todo), args.batch_size)]
+    transcode = voice_manager.ffmpeg_available
+
+    started = time.perf_counter()
+    done = 0
+    failed = 0
+    # spawn, а не fork: у процесса уже есть потоки (синтез, журнал повторений),
+    # fork мог бы унести в дочерний процесс захваченные ими блокировки
+    pool_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=pool_context) as pool:
+        futures = {
+            pool.submit(render_batch, cache.cache_dir, batch, args.lang, transcode, voice_manager.bitrate): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Batch failed: {e}")
+                failed += len(batch)
+                continue
+
+            # Манифест общий с работающим ботом, запись идет под его файловой блокировкой
+            for text, path, ext in results:
+                if ext == '.ogg':
+                    key = voice_manager.cache_key(text, args.lang)
+                else:
+                    key = voice_manager.cache_key(text, args.lang, codec='mp3', bitrate='gtts')
+                cache.put_file(key, ext, path)
+            done += len(results)
+            failed += len(batch) - len(results)
+
+            elapsed = time.perf_counter() - started
+            logger.info(f"{done}/{len(todo)} clips, {done / elapsed:.1f} clips/s")
+
+    elapsed = time.perf_counter() - started
+    stats = cache.stats()
+    print(f"Rendered {done} clips in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f} clips/s), {failed} failed")
+    print(f"Voice cache: {stats['entries']} files, {stats['bytes'] / 1024 / 1024:.1f} MB "
+          f"of {Config.VOICE_CACHE_MAX_BYTES / 1024 / 1024:.0f} MB budget")
+    if stats['evictions']:
+        print(f"Warning: {stats['evictions']} clips were evicted, raise VOICE_CACHE_MAX_BYTES")
+
+
+if __name__ == '__main__':
+    main()
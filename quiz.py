@@ -1,31 +1,202 @@
+import bisect
+import logging
 import random
+import threading
+import time
+from array import array
+
+from models import Word
+
+logger = logging.getLogger(__name__)
+
+# Тип теста в плане урока
+QUIZ_AUDIO = 0
+QUIZ_TRANSLATION = 1
+QUIZ_WORD = 2
+
+# Вариантов ответа в тесте, включая правильный
+QUIZ_OPTIONS = 4
+
+
+# Строки словаря одним куском UTF-8 и массив смещений -
+# на 200k слов это мегабайты, а не сотни тысяч объектов str
+class StringTable:
+    def __init__(self, strings):
+        blob = bytearray()
+        self.offsets = array('i', [0])
+        for string in strings:
+            blob += (string or '').encode()
+            self.offsets.append(len(blob))
+        self.blob = bytes(blob)
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode()
+    
+    def nbytes(self):
+        return len(self.blob) + self.offsets.itemsize * len(self.offsets)
+
+
+# Индекс дистракторов на весь процесс: слова словаря сгруппированы
+# по (level, part_of_speech, topic), (level, part_of_speech) и level.
+# Варианты случайно выбираются сначала из самой узкой группы слова,
+# недостающие - из более широких; к базе при этом не обращаемся.
+# Строится лениво из таблицы words и перестраивается после изменения словаря
+class DistractorIndex:
+    MAX_ATTEMPTS = 12
+    
+    def __init__(self, db):
+        self.db = db
+        self._state = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        db.dictionary_listeners.append(self.invalidate)
+        
+        self.builds = 0
+        self.build_time = 0.0
+    
+    def invalidate(self):
+        # Поколение отличает построение, начатое до изменения словаря
+        self._generation += 1
+        self._state = None
+    
+    def refresh_if_changed(self):
+        # Словарь мог обновить другой процесс (import_words.py)
+        state = self._state
+        if state is not None and state['version'] != self.db.get_dictionary_version():
+            self.invalidate()
+    
+    def build(self):
+        started = time.perf_counter()
+        generation = self._generation
+        version = self.db.get_dictionary_version()
+        session = self.db.get_session()
+        try:
+            rows = session.query(
+                Word.id, Word.word, Word.translation, Word.level, Word.part_of_speech, Word.topic
+            ).order_by(Word.id).all()
+        finally:
+            session.close()
+        
+        groups = {}
+        for pos, (_, _, _, level, part_of_speech, topic) in enumerate(rows):
+            for key in ((level, part_of_speech, topic), (level, part_of_speech), (level,), ()):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = array('i')
+                group.append(pos)
+        
+        state = {
+            'version': version,
+            'ids': array('l', (row[0] for row in rows)),
+            'words': StringTable(row[1] for row in rows),
+            'translations': StringTable(row[2] for row in rows),
+            'groups': groups
+        }
+        # Словарь изменился, пока шло чтение - индекс отдаем, но не сохраняем,
+        # следующий вызов построит его заново
+        if generation == self._generation:
+            self._state = state
+        self.builds += 1
+        self.build_time = time.perf_counter() - started
+        logger.info(f"Distractor index: {len(rows)} words, {len(groups)} groups in {self.build_time:.2f}s")
+        return state
+    
+    def translations(self, word, k=3):
+        state = self._get_state()
+        return [state['translations'][pos] for pos in self._sample(state, word, k, 'translations', word.translation)]
+    
+    def words(self, word, k=3):
+        state = self._get_state()
+        return [state['words'][pos] for pos in self._sample(state, word, k, 'words', word.word)]
+    
+    def pick_ids(self, word, k=3, field='translations'):
+        # То же, но id слов - для компактного плана теста
+        state = self._get_state()
+        correct = word.word if field == 'words' else word.translation
+        return [state['ids'][pos] for pos in self._sample(state, word, k, field, correct)]
+    
+    def text(self, word_id, field='translations'):
+        # ids отсортированы при построении, поиск без словаря id -> позиция
+        state = self._get_state()
+        ids = state['ids']
+        pos = bisect.bisect_left(ids, word_id)
+        if pos < len(ids) and ids[pos] == word_id:
+            return state[field][pos]
+        return None
+    
+    def stats(self):
+        state = self._state
+        if state is None:
+            return {'words': 0, 'groups': 0, 'bytes': 0, 'builds': self.builds}
+        return {
+            'words': len(state['ids']),
+            'groups': len(state['groups']),
+            'bytes': (state['words'].nbytes() + state['translations'].nbytes() + state['ids'].itemsize * len(state['ids'])
+                      + sum(g.itemsize * len(g) for g in state['groups'].values())),
+            'builds': self.builds,
+            'build_time': self.build_time
+        }
+    
+    def _get_state(self):
+        state = self._state
+        if state is None:
+            with self._lock:
+                state = self._state or self.build()
+        return state
+    
+    def _sample(self, state, word, k, field, correct):
+        # Позиции вариантов, отличающихся от правильного ответа и друг от друга по тексту
+        strings = state[field]
+        ids = state['ids']
+        groups = state['groups']
+        
+        chosen = []
+        seen = {correct}
+        for key in ((word.level, word.part_of_speech, word.topic), (word.level, word.part_of_speech), (word.level,), ()):
+            group = groups.get(key)
+            if group is None or len(group) < 2:
+                continue
+            for _ in range(self.MAX_ATTEMPTS):
+                pos = group[random.randrange(len(group))]
+                if ids[pos] == word.id:
+                    continue
+                text = strings[pos]
+                if text not in seen:
+                    seen.add(text)
+                    chosen.append(pos)
+                    if len(chosen) == k:
+                        return chosen
+        return chosen
 
 class QuizGenerator:
     QUIZ_TYPES = ['translation', 'word', 'fill', 'audio']
     
-    @staticmethod
-    def generate_quiz(word, context_words=None, with_audio=False):
+    def __init__(self, distractors=None):
+        self.distractors = distractors
+    
+    def generate_quiz(self, word, context_words=None, with_audio=False):
         if with_audio:
-            return QuizGenerator.audio_quiz(word)
+            return self.audio_quiz(word)
         
         quiz_type = random.choice(QuizGenerator.QUIZ_TYPES)
         
         if quiz_type == 'translation':
-            return QuizGenerator.translation_quiz(word, context_words)
+            return self.translation_quiz(word, context_words)
         elif quiz_type == 'word':
-            return QuizGenerator.word_quiz(word, context_words)
+            return self.word_quiz(word, context_words)
         elif quiz_type == 'fill':
-            return QuizGenerator.fill_blank_quiz(word)
+            return self.fill_blank_quiz(word)
         else:
-            return QuizGenerator.audio_quiz(word)
+            return self.audio_quiz(word)
     
-    @staticmethod
-    def translation_quiz(word, context_words):
-        wrong = []
-        if context_words:
-            candidates = [w.translation for w in context_words if w.id != word.id]
-            if candidates:
-                wrong = random.sample(candidates, min(3, len(candidates)))
+    def translation_quiz(self, word, context_words=None):
+        wrong = self.distractors.translations(word) if self.distractors else []
+        if len(wrong) < 3 and context_words:
+            candidates = [w.translation for w in context_words if w.id != word.id and w.translation not in wrong]
+            wrong += random.sample(candidates, min(3 - len(wrong), len(candidates)))
         
         while len(wrong) < 3:
             wrong.append(f"вариант_{random.randint(1, 100)}")
@@ -42,13 +213,11 @@ class QuizGenerator:
             'points': 10
         }
     
-    @staticmethod
-    def word_quiz(word, context_words):
-        wrong = []
-        if context_words:
-            candidates = [w.word for w in context_words if w.id != word.id]
-            if candidates:
-                wrong = random.sample(candidates, min(3, len(candidates)))
+    def word_quiz(self, word, context_words=None):
+        wrong = self.distractors.words(word) if self.distractors else []
+        if len(wrong) < 3 and context_words:
+            candidates = [w.word for w in context_words if w.id != word.id and w.word not in wrong]
+            wrong += random.sample(candidates, min(3 - len(wrong), len(candidates)))
         
         while len(wrong) < 3:
             wrong.append(f"word_{random.randint(1, 100)}")
@@ -65,10 +234,9 @@ class QuizGenerator:
             'points': 10
         }
     
-    @staticmethod
-    def fill_blank_quiz(word):
+    def fill_blank_quiz(self, word):
         if not word.example:
-            return QuizGenerator.translation_quiz(word, None)
+            return self.translation_quiz(word)
         
         example = word.example.replace(word.word, '_____', 1)
         
@@ -81,19 +249,87 @@ class QuizGenerator:
             'points': 15
         }
     
-    @staticmethod
-    def audio_quiz(word):
+    def audio_quiz(self, word):
+        options = [word.translation] + (self.distractors.translations(word) if self.distractors else [])
+        random.shuffle(options)
         return {
             'type': 'audio',
             'question': "🎧 *Прослушай слово и выбери перевод*",
             'word': word.word,
             'word_id': word.id,
             'correct': word.translation,
-            'options': [],
+            'options': options,
             'points': 20,
             'has_audio': True
         }
     
+    def build_plan(self, words, with_audio=False):
+        # План тестов на весь урок за один проход: на каждое слово байт
+        # (тип << 2 | индекс правильного варианта) и QUIZ_OPTIONS id слов-вариантов
+        # (0 - пустой вариант, если в словаре не набралось похожих слов)
+        meta = bytearray()
+        option_ids = array('i')
+        for word in words:
+            quiz_type = QUIZ_AUDIO if with_audio else random.choice((QUIZ_TRANSLATION, QUIZ_WORD))
+            field = 'words' if quiz_type == QUIZ_WORD else 'translations'
+            
+            wrong = self.distractors.pick_ids(word, QUIZ_OPTIONS - 1, field) if self.distractors else []
+            if len(wrong) < QUIZ_OPTIONS - 1:
+                attr = 'word' if field == 'words' else 'translation'
+                texts = {getattr(word, attr)}
+                for other in words:
+                    if len(wrong) == QUIZ_OPTIONS - 1:
+                        break
+                    if other.id not in wrong and getattr(other, attr) not in texts:
+                        texts.add(getattr(other, attr))
+                        wrong.append(other.id)
+            wrong += [0] * (QUIZ_OPTIONS - 1 - len(wrong))
+            
+            correct = random.randrange(QUIZ_OPTIONS)
+            wrong.insert(correct, word.id)
+            option_ids.extend(wrong)
+            meta.append(quiz_type << 2 | correct)
+        return bytes(meta), option_ids
+    
+    def plan_quiz(self, word, quiz_type, correct, option_ids, words_by_id=None, with_audio=True):
+        # Тест из плана урока: варианты - пары (индекс, текст), пустые пропускаются.
+        # Тексты берутся из индекса дистракторов, к базе не обращаемся.
+        # План строится в начале урока; если звук с тех пор выключили, аудио-тест
+        # задается как тест на перевод - варианты у них одни и те же (переводы)
+        if quiz_type == QUIZ_AUDIO and not with_audio:
+            quiz_type = QUIZ_TRANSLATION
+        field = 'words' if quiz_type == QUIZ_WORD else 'translations'
+        attr = 'word' if quiz_type == QUIZ_WORD else 'translation'
+        
+        options = []
+        for i, option_id in enumerate(option_ids):
+            text = None
+            if option_id == word.id:
+                text = getattr(word, attr)
+            elif option_id and self.distractors:
+                text = self.distractors.text(option_id, field)
+            if text is None and words_by_id and option_id in words_by_id:
+                # Вариант из слов самого урока (без индекса или слово удалили из словаря)
+                text = getattr(words_by_id[option_id], attr)
+            if text:
+                options.append((i, text))
+        
+        if quiz_type == QUIZ_AUDIO:
+            question = "🎧 Какое это слово?"
+        elif quiz_type == QUIZ_WORD:
+            question = f"Какое слово означает *{word.translation}*?"
+        else:
+            question = f"Как переводится слово *{word.word}*?"
+        
+        return {
+            'type': quiz_type,
+            'question': question,
+            'options': options,
+            'correct': correct,
+            'answer': getattr(word, attr),
+            'word_id': word.id
+        }
+    
     @staticmethod
     def check_answer(quiz, answer):
         if quiz['type'] == 'fill':
@@ -0,0 +1,39 @@
+# Проверка и пересчет счетчиков статистики (выученные слова по уровням,
+# total_words_learned) по таблице user_word_progress:
+#
+#   python rebuild_stats.py           # пересчитать и исправить
+#   python rebuild_stats.py --check   # только показать расхождения
+import argparse
+import logging
+import sys
+import time
+
+from database import Database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and rebuild user stats counters")
+    parser.add_argument('--check', action='store_true', help="Report mismatches without fixing them")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    db = Database()
+    started = time.perf_counter()
+    mismatches = db.rebuild_stats_counters(fix=not args.check)
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    for user_id, field, stored, expected in mismatches:
+        print(f"user {user_id}: {field} {stored} -> {expected}")
+
+    users = len({m[0] for m in mismatches})
+    action = "found" if args.check else "fixed"
+    print(f"{len(mismatches)} mismatches {action} for {users} users in {elapsed:.2f}s")
+
+    if args.check and mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+from collections import namedtuple
+
+# Компактные неизменяемые записи вместо отсоединенных ORM-объектов
+
+UserRecord = namedtuple('UserRecord', [
+    'id', 'telegram_id', 'first_name', 'level', 'daily_words', 'streak',
+    'audio_enabled', 'notification_enabled', 'notification_time', 'timezone'
+])
+
+
+def user_record(user):
+    return UserRecord(
+        id=user.id,
+        telegram_id=user.telegram_id,
+        first_name=user.first_name,
+        level=user.level,
+        daily_words=user.daily_words,
+        streak=user.streak,
+        audio_enabled=user.audio_enabled,
+        notification_enabled=user.notification_enabled,
+        notification_time=user.notification_time,
+        timezone=user.timezone or 'UTC'
+    )
+
+
+WordRecord = namedtuple('WordRecord', [
+    'id', 'word', 'translation', 'transcription', 'example', 'example_translation',
+    'level', 'part_of_speech', 'topic', 'frequency'
+])
+
+
+def word_record(word):
+    return WordRecord(
+        id=word.id,
+        word=word.word,
+        translation=word.translation,
+        transcription=word.transcription,
+        example=word.example,
+        example_translation=word.example_translation,
+        level=word.level,
+        part_of_speech=word.part_of_speech,
+        topic=word.topic,
+        frequency=word.frequency
+    )
+
+
+LevelProgress = namedtuple('LevelProgress', ['level', 'total', 'learned', 'percent'])
+
+UserStatsRecord = namedtuple('UserStatsRecord', [
+    'user', 'total_reviews', 'correct_reviews', 'total_words_learned',
+    'longest_streak', 'accuracy', 'due_today', 'level_progress'
+])
+
+
+def user_stats_record(user, stats, due_today, level_totals):
+    # level_progress - кортеж LevelProgress в порядке Config.LEVELS
+    level_learned = stats.level_learned or {}
+    level_progress = []
+    for level, total in level_totals:
+        learned = level_learned.get(level, 0)
+        level_progress.append(LevelProgress(
+            level=level,
+            total=total,
+            learned=learned,
+            percent=(learned / total * 100) if total > 0 else 0
+        ))
+
+    total_reviews = stats.total_reviews or 0
+    return UserStatsRecord(
+        user=user_record(user),
+        total_reviews=total_reviews,
+        correct_reviews=stats.correct_reviews or 0,
+        total_words_learned=stats.total_words_learned or 0,
+        longest_streak=stats.longest_streak or 0,
+        accuracy=((stats.correct_reviews or 0) / total_reviews * 100) if total_reviews > 0 else 0,
+        due_today=due_today,
+        level_progress=tuple(level_progress)
+    )
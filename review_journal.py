@@ -0,0 +1,133 @@
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ReviewEvent = namedtuple('ReviewEvent', ['user_id', 'word_id', 'correct', 'reviewed_at'])
+
+
+# Хендлеры только добавляют события, фоновый поток применяет их
+# пачками через apply_batch(events) в одной транзакции
+class ReviewJournal:
+    def __init__(self, apply_batch, flush_interval=0.5, max_batch=500):
+        self.apply_batch = apply_batch
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._pending = []
+        self._pending_users = {}
+        self._inflight_users = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Держится все время, пока пачка применяется к БД
+        self._apply_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+        self.submitted = 0
+        self.flushed_events = 0
+        self.flushed_batches = 0
+        self.dropped_events = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='review-journal', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Дописываем все, что осталось в очереди
+        self.flush()
+
+    def submit(self, user_id, word_id, correct):
+        event = ReviewEvent(user_id, word_id, bool(correct), datetime.utcnow())
+        with self._lock:
+            self.submitted += 1
+            if not self._stopped:
+                self._pending.append(event)
+                self._pending_users[user_id] = self._pending_users.get(user_id, 0) + 1
+                if len(self._pending) >= self.max_batch:
+                    self._wakeup.notify()
+                return
+        # Журнал уже остановлен - пишем синхронно
+        with self._apply_lock:
+            self._apply([event])
+
+    def has_pending(self, user_id):
+        with self._lock:
+            return user_id in self._pending_users or user_id in self._inflight_users
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, user_id=None):
+        # С user_id - только события этого пользователя (read-your-writes
+        # перед чтением его данных) плюс ожидание уже начатой пачки
+        if user_id is not None and not self.has_pending(user_id):
+            return
+        with self._apply_lock:
+            while True:
+                events = self._take(user_id)
+                if not events:
+                    break
+                self._apply(events)
+
+    def _take(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                events = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            else:
+                if user_id not in self._pending_users:
+                    return []
+                events = [e for e in self._pending if e.user_id == user_id]
+                self._pending = [e for e in self._pending if e.user_id != user_id]
+
+            for event in events:
+                left = self._pending_users[event.user_id] - 1
+                if left:
+                    self._pending_users[event.user_id] = left
+                else:
+                    del self._pending_users[event.user_id]
+                self._inflight_users.add(event.user_id)
+            return events
+
+    def _apply(self, events):
+        try:
+            self.apply_batch(events)
+            self.flushed_events += len(events)
+            self.flushed_batches += 1
+        except Exception as e:
+            logger.error(f"Review batch of {len(events)} failed: {e}, retrying one by one")
+            # Ищем "битое" событие, чтобы не потерять всю пачку
+            for event in events:
+                try:
+                    self.apply_batch([event])
+                    self.flushed_events += 1
+                except Exception as e:
+                    self.dropped_events += 1
+                    logger.error(f"Dropping review event {event}: {e}")
+        finally:
+            with self._lock:
+                self._inflight_users.difference_update(e.user_id for e in events)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if len(self._pending) < self.max_batch and not self._stopped:
+                    self._wakeup.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Review journal flush error: {e}")
@@ -0,0 +1,153 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'notifications'
+
+
+def next_fire_time(notification_time, timezone, after):
+    # Ближайший момент (UTC, naive) строго после after, когда в timezone наступает notification_time
+    try:
+        tz = ZoneInfo(timezone or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo('UTC')
+    hour, minute = map(int, notification_time.split(':'))
+
+    local = after.replace(tzinfo=ZoneInfo('UTC')).astimezone(tz)
+    candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    while True:
+        fire_at = candidate.astimezone(ZoneInfo('UTC')).replace(tzinfo=None)
+        if fire_at > after:
+            return fire_at
+        candidate = (candidate.replace(tzinfo=None) + timedelta(days=1)).replace(tzinfo=tz)
+
+
+# Планировщик уведомлений внутри процесса бота.
+# Корзина - пара (notification_time, timezone); в куче лежит ближайший
+# момент срабатывания каждой непустой корзины. Поток спит ровно до
+# ближайшего срабатывания, изменения настроек пользователей правят
+# корзины по одной, без перестройки всей кучи.
+class NotificationScheduler:
+    def __init__(self, db, send_bucket, catchup=None):
+        self.db = db
+        self.send_bucket = send_bucket
+        self.catchup = catchup if catchup is not None else timedelta(hours=Config.NOTIFICATION_CATCHUP_HOURS)
+
+        self._members = {}
+        self._scheduled = {}
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+        self.fired = 0
+        self.caught_up = 0
+
+    def start(self):
+        now = datetime.utcnow()
+        last_run = self.db.get_scheduler_last_run(STATE_NAME)
+        if last_run is None or now - last_run > self.catchup:
+            last_run = now - self.catchup if last_run else now
+
+        # Подписка и начальная загрузка - под блокировкой изменений пользователей:
+        # изменение либо уже попало в загрузку, либо придет в user_changed после нее
+        with self.db.user_change_lock, self._cond:
+            self.db.user_listeners.append(self.user_changed)
+            for notification_time, timezone, count in self.db.get_notification_buckets():
+                bucket = (notification_time, timezone or 'UTC')
+                self._members[bucket] = self._members.get(bucket, 0) + count
+                # После перезапуска пропущенные корзины сработают сразу
+                fire_at = next_fire_time(bucket[0], bucket[1], last_run)
+                if fire_at <= now:
+                    self.caught_up += 1
+                self._schedule(bucket, fire_at)
+
+        self._thread = threading.Thread(target=self._run, name='notification-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Notification scheduler started: {len(self._members)} buckets, {self.caught_up} to catch up")
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def user_changed(self, old, new):
+        old_bucket = self._bucket(old)
+        new_bucket = self._bucket(new)
+        if old_bucket == new_bucket:
+            return
+
+        with self._cond:
+            if old_bucket:
+                left = self._members.get(old_bucket, 0) - 1
+                if left > 0:
+                    self._members[old_bucket] = left
+                else:
+                    # Запись в куче удалится лениво при срабатывании
+                    self._members.pop(old_bucket, None)
+                    self._scheduled.pop(old_bucket, None)
+
+            if new_bucket:
+                self._members[new_bucket] = self._members.get(new_bucket, 0) + 1
+                if new_bucket not in self._scheduled:
+                    fire_at = next_fire_time(new_bucket[0], new_bucket[1], datetime.utcnow())
+                    if self._schedule(new_bucket, fire_at):
+                        self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return sorted((fire_at, bucket) for bucket, fire_at in self._scheduled.items())
+
+    @staticmethod
+    def _bucket(record):
+        if record is None or not record.notification_enabled:
+            return None
+        return (record.notification_time, record.timezone or 'UTC')
+
+    def _schedule(self, bucket, fire_at):
+        # True, если корзина стала ближайшей и поток надо разбудить
+        self._scheduled[bucket] = fire_at
+        heapq.heappush(self._heap, (fire_at, bucket))
+        return self._heap[0] == (fire_at, bucket)
+
+    def _next_due(self):
+        with self._cond:
+            while not self._stopped:
+                # Выбрасываем устаревшие записи (корзина опустела или перенесена)
+                while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                fire_at, bucket = self._heap[0]
+                delay = (fire_at - datetime.utcnow()).total_seconds()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+                heapq.heappop(self._heap)
+                self._schedule(bucket, next_fire_time(bucket[0], bucket[1], fire_at))
+                return fire_at, bucket
+            return None
+
+    def _run(self):
+        while True:
+            due = self._next_due()
+            if due is None:
+                return
+
+            fire_at, (notification_time, timezone) = due
+            try:
+                self.send_bucket(notification_time, timezone)
+                self.fired += 1
+            except Exception as e:
+                logger.error(f"Notification bucket {notification_time} {timezone} failed: {e}")
+            self.db.set_scheduler_last_run(STATE_NAME, fire_at)
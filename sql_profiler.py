@@ -0,0 +1,194 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Профиль обновления, которое сейчас обрабатывается (ставится в задаче шарда)
+current_profile = contextvars.ContextVar('current_profile', default=None)
+
+EXPLAIN_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+# Все запросы одного обновления: текст запроса -> [число выполнений, время]
+class UpdateProfile:
+    __slots__ = ('update_id', 'handler', 'statements', 'count', 'elapsed')
+
+    def __init__(self, update_id, handler):
+        self.update_id = update_id
+        self.handler = handler
+        self.statements = {}
+        self.count = 0
+        self.elapsed = 0.0
+
+    def record(self, statement, elapsed):
+        entry = self.statements.get(statement)
+        if entry is None:
+            entry = self.statements[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+        self.count += 1
+        self.elapsed += elapsed
+
+
+# Профилирование SQL через события SQLAlchemy.
+# Лог медленных запросов (с EXPLAIN QUERY PLAN) работает всегда, пока задан
+# порог slow_ms. Профиль по обновлениям включается на лету (configure):
+# каждый запрос получает комментарий с обработчиком и update_id, в конце
+# обновления считаются запросы и время, а одинаковые запросы, повторенные
+# repeat_threshold раз и больше, логируются как вероятный N+1
+class SqlProfiler:
+    def __init__(self, enabled=False, slow_ms=200, repeat_threshold=5, history=100):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000 if slow_ms else 0
+        self.repeat_threshold = repeat_threshold
+        self._handlers = {}
+        self._recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+        self.slow_queries = 0
+        self.repeated_statements = 0
+
+    def configure(self, enabled=None, slow_ms=None, repeat_threshold=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if slow_ms is not None:
+            self.slow_seconds = slow_ms / 1000
+        if repeat_threshold is not None:
+            self.repeat_threshold = repeat_threshold
+        logger.info(
+            f"SQL profiling {'enabled' if self.enabled else 'disabled'}, slow queries over "
+            f"{self.slow_seconds * 1000:.0f} ms, repeats from {self.repeat_threshold}"
+        )
+
+    def instrument(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute, retval=True)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def begin(self, handler, update_id=None):
+        # None при выключенном профилировании - обновление ничего не стоит
+        if not self.enabled:
+            return None
+        profile = UpdateProfile(update_id, handler)
+        current_profile.set(profile)
+        return profile
+
+    def finish(self, profile):
+        repeated = [(statement, count, elapsed) for statement, (count, elapsed) in profile.statements.items()
+                    if count >= self.repeat_threshold]
+        for statement, count, elapsed in repeated:
+            logger.warning(
+                f"Possible N+1 in {profile.handler} (update {profile.update_id}): "
+                f"{count} x {_short(statement)} ({elapsed * 1000:.1f} ms total)"
+            )
+        logger.debug(
+            f"SQL for {profile.handler} (update {profile.update_id}): "
+            f"{profile.count} statements, {profile.elapsed * 1000:.1f} ms"
+        )
+
+        with self._lock:
+            self.repeated_statements += len(repeated)
+            entry = self._handlers.get(profile.handler)
+            if entry is None:
+                entry = self._handlers[profile.handler] = [0, 0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += profile.count
+            entry[2] += profile.elapsed
+            entry[3] = max(entry[3], profile.count)
+            self._recent.append({
+                'update_id': profile.update_id,
+                'handler': profile.handler,
+                'statements': profile.count,
+                'elapsed_ms': round(profile.elapsed * 1000, 2),
+                'repeated': [(count, _short(statement)) for statement, count, elapsed in repeated]
+            })
+
+    def stats(self):
+        with self._lock:
+            handlers = {
+                handler: {
+                    'updates': updates,
+                    'statements': statements,
+                    'statements_avg': statements / updates,
+                    'statements_max': max_statements,
+                    'elapsed_ms_avg': elapsed / updates * 1000
+                }
+                for handler, (updates, statements, elapsed, max_statements) in self._handlers.items()
+            }
+            recent = list(self._recent)
+        return {
+            'enabled': self.enabled,
+            'slow_ms': self.slow_seconds * 1000,
+            'repeat_threshold': self.repeat_threshold,
+            'slow_queries': self.slow_queries,
+            'repeated_statements': self.repeated_statements,
+            'handlers': handlers,
+            'recent': recent
+        }
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.enabled and not self.slow_seconds:
+            return statement, parameters
+        profile = current_profile.get() if self.enabled else None
+        conn.info.setdefault('sql_profile', []).append((time.perf_counter(), statement, profile))
+        if profile is not None:
+            # Метка видна в логах сервера БД; пока профиль включен, SQLite
+            # перекомпилирует запросы - текст у каждого обновления свой
+            statement = f'/* handler={profile.handler} update={profile.update_id} */ {statement}'
+        return statement, parameters
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('sql_profile')
+        if not stack:
+            return
+        started, statement, profile = stack.pop()
+        elapsed = time.perf_counter() - started
+        if profile is not None:
+            profile.record(statement, elapsed)
+
+        if self.slow_seconds and elapsed >= self.slow_seconds:
+            self.slow_queries += 1
+            handler = profile.handler if profile is not None else 'unknown'
+            update_id = profile.update_id if profile is not None else None
+            plan = self._explain(conn, cursor, statement, parameters, executemany)
+            logger.warning(
+                f"Slow query {elapsed * 1000:.1f} ms in {handler} (update {update_id}): "
+                f"{_short(statement, 500)}" + (f"\n{plan}" if plan else "")
+            )
+
+    def _handle_error(self, context):
+        stack = context.connection.info.get('sql_profile') if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+    @staticmethod
+    def _explain(conn, cursor, statement, parameters, executemany):
+        if executemany or not statement.lstrip().upper().startswith(EXPLAIN_STATEMENTS):
+            return None
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        # Отдельный курсор DBAPI в том же соединении: без событий и в той же транзакции
+        try:
+            plan_cursor = cursor.connection.cursor()
+            try:
+                plan_cursor.execute(prefix + statement, parameters)
+                rows = plan_cursor.fetchall()
+            finally:
+                plan_cursor.close()
+        except Exception as e:
+            return f"  (no plan: {e})"
+        return '\n'.join(f"  {row[-1]}" for row in rows)
+
+
+def _short(statement, limit=200):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+profiler = SqlProfiler(Config.SQL_PROFILE, Config.SQL_SLOW_QUERY_MS, Config.SQL_REPEAT_THRESHOLD)
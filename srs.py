@@ -1,33 +1,52 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+from config import Config
+
+# Качество ответа по шкале 0-5, ниже 3 - ошибка
+QUALITY_WRONG = 1
+QUALITY_CORRECT = 4
+
+# После ошибки слово возвращается через 6 часов
+RETRY_DAYS = 0.25
+
+QUALITY_FACTORS = {3: 0.8, 4: 1.0, 5: 1.2}
 
 class SRSManager:
     @staticmethod
     def calculate_next_review(stage, quality):
         if quality < 3:
-            new_stage = max(0, stage - 2)
-            days = 0.25
-        else:
-            new_stage = stage + 1
-            
-            if new_stage == 1:
-                days = 1
-            elif new_stage == 2:
-                days = 3
-            elif new_stage == 3:
-                days = 7
-            elif new_stage == 4:
-                days = 14
-            elif new_stage >= 5:
-                days = 30
-                new_stage = 5
-            else:
-                days = 0
-                
-            if quality == 3:
-                days = days * 0.8
-            elif quality == 4:
-                days = days * 1.0
-            elif quality == 5:
-                days = days * 1.2
+            return max(0, stage - 2), RETRY_DAYS
+        
+        new_stage = min(stage + 1, Config.MAX_STAGE)
+        days = Config.SRS_STAGES[new_stage] * QUALITY_FACTORS.get(quality, 1.0)
+        return new_stage, days or RETRY_DAYS
+    
+    @staticmethod
+    def schedule(stage, quality, reviewed_at):
+        new_stage, days = SRSManager.calculate_next_review(stage, quality)
+        return new_stage, reviewed_at + timedelta(days=days)
+    
+    @staticmethod
+    def schedule_batch(stages, qualities, reviewed_at):
+        # То же, что schedule, но для массивов: stages и qualities - целые,
+        # reviewed_at - datetime64. Возвращает (new_stages, next_review)
+        import numpy as np
+        
+        stages = np.asarray(stages, dtype=np.int64)
+        qualities = np.clip(np.asarray(qualities, dtype=np.int64), 0, 5)
+        reviewed_at = np.asarray(reviewed_at, dtype='datetime64[us]')
+        
+        intervals = np.asarray(Config.SRS_STAGES, dtype=np.float64)
+        factors = np.array([QUALITY_FACTORS.get(q, 1.0) for q in range(6)])
+        
+        correct = qualities >= 3
+        new_stages = np.where(
+            correct,
+            np.minimum(stages + 1, Config.MAX_STAGE),
+            np.maximum(stages - 2, 0)
+        )
+        days = np.where(correct, intervals[new_stages] * factors[qualities], RETRY_DAYS)
+        days[days == 0] = RETRY_DAYS
         
-        return new_stage, days
\ No newline at end of file
+        next_review = reviewed_at + np.rint(days * 86400e6).astype('timedelta64[us]')
+        return new_stages, next_review
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# LRU + TTL кэш записей пользователей по telegram_id
+class UserCache:
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, telegram_id):
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, record = entry
+            if expires_at < time.monotonic():
+                del self._entries[telegram_id]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return record
+
+    def put(self, record):
+        with self._lock:
+            self._entries[record.telegram_id] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(record.telegram_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / total if total else 0
+        }
+
+
+# LRU кэш записей слов по id. Без TTL: после изменения словаря его
+# целиком очищает Database.dictionary_changed
+class WordCache:
+    def __init__(self, max_size=5000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, word_ids):
+        found = {}
+        with self._lock:
+            for word_id in word_ids:
+                record = self._entries.get(word_id)
+                if record is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(word_id)
+                self.hits += 1
+                found[word_id] = record
+        return found
+
+    def put_many(self, records):
+        with self._lock:
+            for record in records:
+                self._entries[record.id] = record
+                self._entries.move_to_end(record.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / total if total else 0
+        }
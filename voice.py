@@ -1,23 +1,178 @@
 import os
 import asyncio
 import logging
-from datetime import datetime
-import hashlib
-import random
-import tempfile
 import subprocess
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from config import Config
+from audio_cache import AudioCache
+import metrics
 
 logger = logging.getLogger(__name__)
 
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 10
+
+# Пул потоков для синтеза (gTTS + ffmpeg блокируют поток).
+# Одинаковые запросы, пока первый не готов, получают один и тот же Future.
+# Для предзагрузки запоминаем владельцев запроса: общий Future отменяется,
+# только когда от него отказался последний владелец
+class SynthesisEngine:
+    def __init__(self, workers=4, max_queue=200):
+        self.max_queue = max_queue
+        self._queue = queue.PriorityQueue()
+        # key -> [future, priority, owners]
+        self._inflight = {}
+        # Запросы в очереди, которые еще не начаты и не отменены: повторные
+        # и отмененные элементы PriorityQueue в лимит не входят
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f'tts-{i}', daemon=True).start()
+    
+    def submit(self, key, fn, priority=PRIORITY_INTERACTIVE, owner=None):
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None:
+                future, queued_priority, owners = entry
+                self.deduplicated += 1
+                if owner is not None:
+                    owners.add(owner)
+                if priority < queued_priority and not future.running():
+                    # Пользователь ждет клип из предзагрузки - ставим его в очередь еще раз
+                    # с высоким приоритетом, второй экземпляр воркер пропустит
+                    entry[1] = priority
+                    self._queue.put((priority, next(self._seq), key, fn, future))
+                return future
+            
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                return None
+            
+            future = Future()
+            self._inflight[key] = [future, priority, {owner} if owner is not None else set()]
+            self._pending += 1
+            self.submitted += 1
+            self._queue.put((priority, next(self._seq), key, fn, future))
+            return future
+    
+    def cancel(self, key, future, owner, priority):
+        # Отменяем, только если у запроса не осталось других владельцев
+        # и никто не поднял его приоритет
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is None or entry[0] is not future:
+                return False
+            owners = entry[2]
+            owners.discard(owner)
+            if owners or entry[1] != priority:
+                return False
+            if future.cancel():
+                del self._inflight[key]
+                self._pending -= 1
+                return True
+            return False
+    
+    def queue_depth(self):
+        return self._pending
+    
+    def metrics(self):
+        done = self.completed + self.failed
+        return {
+            'queue_depth': self.queue_depth(),
+            'inflight': len(self._inflight),
+            'submitted': self.submitted,
+            'deduplicated': self.deduplicated,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'latency_avg': self.latency_total / done if done else 0,
+            'latency_max': self.latency_max
+        }
+    
+    def _worker(self):
+        while True:
+            priority, seq, key, fn, future = self._queue.get()
+            with self._lock:
+                if future.running() or future.done():
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._pending -= 1
+            
+            started = time.perf_counter()
+            status = 'ok'
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+                status = 'failed'
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.tts_seconds.observe(elapsed, status)
+                self._finish(key, future, status, elapsed)
+    
+    def _finish(self, key, future, status, elapsed):
+        # Счетчики меняют все воркеры сразу - только под общей блокировкой
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is future:
+                del self._inflight[key]
+            if status == 'ok':
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+    
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
 class VoiceManager:
     def __init__(self):
-        self.cache_dir = "voice_cache"
-        self._ensure_cache_dir()
-        self.memory_cache = {}
-        self.max_cache_size = 100
+        self.cache_dir = Config.VOICE_CACHE_DIR
         
         # Проверяем наличие ffmpeg
         self.ffmpeg_available = self._check_ffmpeg()
+        if self.ffmpeg_available:
+            self.codec, self.bitrate, self.ext = 'opus', '24k', '.ogg'
+        else:
+            self.codec, self.bitrate, self.ext = 'mp3', 'gtts', '.mp3'
+        
+        self.cache = AudioCache(self.cache_dir, Config.VOICE_CACHE_MAX_BYTES)
+        
+        self.engine = SynthesisEngine(
+            workers=Config.TTS_WORKERS,
+            max_queue=Config.TTS_QUEUE_SIZE
+        )
+        self.timeout = Config.TTS_TIMEOUT
+        
+        # Предзагрузка озвучки для начатых уроков
+        self._prefetch_jobs = {}
+        self._prefetched = OrderedDict()
+        self._prefetch_lock = threading.Lock()
+        self.prefetch_submitted = 0
+        self.prefetch_completed = 0
+        self.prefetch_cancelled = 0
+        self.prefetch_used = 0
     
     def _check_ffmpeg(self):
         try:
@@ -29,86 +184,146 @@ class VoiceManager:
             logger.warning("ffmpeg not found, using MP3 format")
             return False
     
-    def _ensure_cache_dir(self):
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
+    def cache_key(self, text, lang='en', slow=False, codec=None, bitrate=None):
+        return AudioCache.make_key(text, lang, slow, codec or self.codec, bitrate or self.bitrate)
     
-    def _get_cache_key(self, text, lang='en'):
-        key_string = f"{text}_{lang}_{random.randint(1,100)}"
-        return hashlib.md5(key_string.encode()).hexdigest()
+    def cache_keys(self, text, lang='en', slow=False):
+        # Ключи, под которыми может лежать клип: основной формат и MP3,
+        # если конвертация не удалась
+        keys = [self.cache_key(text, lang, slow)]
+        if self.codec != 'mp3':
+            keys.append(self.cache_key(text, lang, slow, 'mp3', 'gtts'))
+        return keys
     
-    def _get_cache_path(self, cache_key):
-        return os.path.join(self.cache_dir, f"{cache_key}")
+    def cached_path(self, text, lang='en', slow=False, count=True):
+        path = self.cache.get(self.cache_key(text, lang, slow), self.ext, count)
+        if path is None and self.codec != 'mp3':
+            # Клип, для которого не сработала конвертация, лежит как MP3
+            path = self.cache.get(self.cache_key(text, lang, slow, 'mp3', 'gtts'), '.mp3', False)
+        return path
     
     async def text_to_speech(self, text, lang='en', slow=False):
+        key = self.cache_key(text, lang, slow)
+        self._mark_prefetch_used(key)
+        
+        path = self.cached_path(text, lang, slow)
+        if path:
+            return path
+        
+        future = self.engine.submit(key, lambda: self._synthesize(text, lang, slow))
+        if future is None:
+            logger.warning(f"TTS queue is full, dropping request for {text!r}")
+            return None
+        
         try:
-            cache_key = self._get_cache_key(text, lang)
+            # shield: по таймауту отменяется только ожидание, общий Future живет дальше
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            self.engine.record_timeout()
+            logger.error(f"TTS timeout for {text!r}")
+            return None
+    
+    def prefetch(self, owner, texts, lang='en'):
+        self.cancel_prefetch(owner)
+        
+        jobs = []
+        for text in dict.fromkeys(texts):
+            if not text or self.cached_path(text, lang, count=False):
+                continue
             
-            # Проверяем кэш
-            for ext in ['.ogg', '.mp3']:
-                cache_path = os.path.join(self.cache_dir, f"{cache_key}{ext}")
-                if os.path.exists(cache_path):
-                    logger.info(f"Voice cache hit: {cache_key}")
-                    return cache_path
+            key = self.cache_key(text, lang)
+            future = self.engine.submit(
+                key,
+                lambda text=text: self._synthesize(text, lang, False),
+                priority=PRIORITY_PREFETCH,
+                owner=owner
+            )
+            if future is None:
+                break
+            
+            future.add_done_callback(lambda f, key=key: self._prefetch_done(key, f))
+            jobs.append((key, future))
+        
+        with self._prefetch_lock:
+            self._prefetch_jobs[owner] = jobs
+            self.prefetch_submitted += len(jobs)
+        return len(jobs)
+    
+    def cancel_prefetch(self, owner):
+        with self._prefetch_lock:
+            jobs = self._prefetch_jobs.pop(owner, [])
+        
+        for key, future in jobs:
+            if self.engine.cancel(key, future, owner, PRIORITY_PREFETCH):
+                self.prefetch_cancelled += 1
+    
+    def prefetch_stats(self):
+        return {
+            'submitted': self.prefetch_submitted,
+            'completed': self.prefetch_completed,
+            'cancelled': self.prefetch_cancelled,
+            'used': self.prefetch_used,
+            'used_ratio': self.prefetch_used / self.prefetch_completed if self.prefetch_completed else 0
+        }
+    
+    def _prefetch_done(self, key, future):
+        if future.cancelled() or future.exception() or not future.result():
+            return
+        with self._prefetch_lock:
+            self.prefetch_completed += 1
+            self._prefetched[key] = True
+            while len(self._prefetched) > 10000:
+                self._prefetched.popitem(last=False)
+    
+    def _mark_prefetch_used(self, key):
+        with self._prefetch_lock:
+            if self._prefetched.pop(key, None):
+                self.prefetch_used += 1
+    
+    def _synthesize(self, text, lang, slow):
+        tmp_mp3 = None
+        try:
+            # Пока запрос стоял в очереди, клип мог появиться в кэше
+            path = self.cached_path(text, lang, slow, count=False)
+            if path:
+                return path
             
             from gtts import gTTS
             
-            # Создаем временный MP3 файл
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                tmp_mp3 = tmp_file.name
+            # Временные файлы создаются прямо в кэше, чтобы rename был атомарным
+            tmp_mp3 = self.cache.temp_path('.mp3')
             
-            # Генерируем MP3
-            tts = gTTS(text=text, lang=lang, slow=slow)
+            # Генерируем MP3. Таймаут запроса к Google ограничивает сам воркер:
+            # TTS_TIMEOUT в text_to_speech ограничивает только ожидание вызывающего
+            tts = gTTS(text=text, lang=lang, slow=slow, timeout=self.timeout)
             tts.save(tmp_mp3)
             
             # Пытаемся конвертировать в OGG, если есть ffmpeg
             if self.ffmpeg_available:
+                tmp_ogg = self.cache.temp_path('.ogg')
                 try:
-                    ogg_path = os.path.join(self.cache_dir, f"{cache_key}.ogg")
-                    cmd = ['ffmpeg', '-i', tmp_mp3, '-c:a', 'libopus', '-b:a', '24k', '-y', ogg_path]
-                    subprocess.run(cmd, capture_output=True, check=True)
-                    os.unlink(tmp_mp3)
+                    cmd = ['ffmpeg', '-i', tmp_mp3, '-c:a', 'libopus', '-b:a', self.bitrate, '-y', tmp_ogg]
+                    subprocess.run(cmd, capture_output=True, check=True, timeout=self.timeout)
                     
-                    if os.path.exists(ogg_path):
-                        self.memory_cache[cache_key] = ogg_path
-                        logger.info(f"Voice generated as OGG: {cache_key}")
-                        return ogg_path
-                except:
+                    path = self.cache.put_file(self.cache_key(text, lang, slow), '.ogg', tmp_ogg)
+                    logger.info(f"Voice generated as OGG: {text!r}")
+                    return path
+                except Exception:
                     logger.warning("FFmpeg conversion failed, using MP3")
+                    if os.path.exists(tmp_ogg):
+                        os.unlink(tmp_ogg)
             
             # Если нет ffmpeg или конвертация не удалась, используем MP3
-            mp3_path = os.path.join(self.cache_dir, f"{cache_key}.mp3")
-            os.rename(tmp_mp3, mp3_path)
-            
-            self.memory_cache[cache_key] = mp3_path
-            logger.info(f"Voice generated as MP3: {cache_key}")
-            return mp3_path
+            path = self.cache.put_file(self.cache_key(text, lang, slow, 'mp3', 'gtts'), '.mp3', tmp_mp3)
+            tmp_mp3 = None
+            logger.info(f"Voice generated as MP3: {text!r}")
+            return path
             
         except Exception as e:
             logger.error(f"TTS error: {e}")
             return None
-    
-    async def cleanup_old_cache(self, max_age_hours=24):
-        try:
-            now = datetime.now()
-            deleted = 0
-            
-            for filename in os.listdir(self.cache_dir):
-                filepath = os.path.join(self.cache_dir, filename)
-                file_time = datetime.fromtimestamp(os.path.getctime(filepath))
-                
-                if (now - file_time).total_seconds() > max_age_hours * 3600:
-                    os.remove(filepath)
-                    deleted += 1
-            
-            logger.info(f"Cleaned up {deleted} old voice files")
-            
-        except Exception as e:
-            logger.error(f"Cache cleanup error: {e}")
+        finally:
+            if tmp_mp3 and os.path.exists(tmp_mp3):
+                os.unlink(tmp_mp3)
 
 voice_manager = VoiceManager()
-
-async def periodic_cache_cleanup():
-    while True:
-        await asyncio.sleep(3600)
-        await voice_manager.cleanup_old_cache(max_age_hours=48)
\ No newline at end of file
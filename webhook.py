@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import threading
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def default_secret(bot_token):
+    # Один и тот же на всех экземплярах за балансировщиком и после перезапуска;
+    # Telegram допускает в секрете только A-Z, a-z, 0-9, _ и -
+    return hashlib.sha256(f'webhook:{bot_token}'.encode()).hexdigest()
+
+
+# Прием обновлений от Telegram по HTTP. Проверяет секрет из заголовка
+# и кладет Update в очередь диспетчера. Очередь ограничена: если она
+# полна дольше put_timeout, отвечаем 503 и Telegram повторит доставку позже
+class WebhookReceiver:
+    def __init__(self, bot, update_queue, secret, put_timeout=1.0):
+        self.bot = bot
+        self.update_queue = update_queue
+        self.secret = secret
+        self.put_timeout = put_timeout
+        self._lock = threading.Lock()
+
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.throttled = 0
+
+    def handle(self, secret, body):
+        # Возвращает (HTTP-статус, текст ответа)
+        if not secret or not hmac.compare_digest(secret, self.secret):
+            self._count('rejected')
+            return 403, 'Forbidden'
+
+        try:
+            update = Update.de_json(json.loads(body), self.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Invalid webhook payload: {e}")
+            self._count('invalid')
+            return 400, 'Bad Request'
+
+        try:
+            self.update_queue.put(update, timeout=self.put_timeout)
+        except queue.Full:
+            self._count('throttled')
+            logger.warning(f"Update queue is full ({self.update_queue.qsize()}), asking Telegram to retry")
+            return 503, 'Busy'
+
+        self._count('received')
+        return 200, 'OK'
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'rejected': self.rejected,
+            'invalid': self.invalid,
+            'throttled': self.throttled,
+            'queue_depth': self.update_queue.qsize(),
+            'queue_size': self.update_queue.maxsize
+        }
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)